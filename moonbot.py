@@ -1,28 +1,600 @@
 import chess
 import time
-import argparse
 import json
-import numpy as np
+import os
+import collections
+import math
+import queue
+import sys
+import threading
+import chess.polyglot
+# numpy, chess.pgn, cProfile and the multiprocessing modules are imported by
+# the functions that use them, so starting a bot only pays for chess
 try:
     from moonbot_engine import BitboardMoonBot
 except ImportError:
     BitboardMoonBot = None
 
+# --- Zobrist hashing (Polyglot keys, so hashes match chess.polyglot.zobrist_hash) ---
+ZOBRIST = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+# ZOBRIST_PIECES[color][piece_type][square]
+ZOBRIST_PIECES = [
+    [[0] * 64] + [[ZOBRIST.array[64 * ((piece_type - 1) * 2 + color) + sq] for sq in range(64)] for piece_type in chess.PIECE_TYPES]
+    for color in (chess.BLACK, chess.WHITE)
+]
+
+MATE_SCORE = 99999
+MAX_SEARCH_DEPTH = 64
+# Scores beyond this are mates found by the search (MATE_SCORE - ply)
+MATE_BOUND = MATE_SCORE - 1000
+
+class SearchTimeout(Exception):
+    pass
+
+# --- Evaluation tables ---
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+# Piece-square tables (simplified, for white; black is mirrored)
+PAWN_TABLE = [
+    0, 5, 5, 0, 5, 10, 50, 0,
+    0, 10, -5, 0, 5, 10, 50, 0,
+    0, 10, -10, 0, 10, 20, 50, 0,
+    0, -20, 0, 20, 25, 30, 50, 0,
+    0, -20, 0, 20, 25, 30, 50, 0,
+    0, 10, -10, 0, 10, 20, 50, 0,
+    0, 10, -5, 0, 5, 10, 50, 0,
+    0, 5, 5, 0, 5, 10, 50, 0
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20
+]
+ROOK_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0
+]
+QUEEN_TABLE = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20
+]
+KING_TABLE = [
+    20, 30, 10, 0, 0, 10, 30, 20,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30
+]
+PIECE_TABLES = {
+    chess.PAWN: PAWN_TABLE,
+    chess.KNIGHT: KNIGHT_TABLE,
+    chess.BISHOP: BISHOP_TABLE,
+    chess.ROOK: ROOK_TABLE,
+    chess.QUEEN: QUEEN_TABLE,
+    chess.KING: KING_TABLE
+}
+# Material + PST in one (12, 64) table from White's point of view: rows 0-5 are
+# white P..K, rows 6-11 black p..k (mirrored and negated)
+PST = [[0] * 64 for _ in range(12)]
+for piece_type, table in PIECE_TABLES.items():
+    for square in chess.SQUARES:
+        PST[piece_type - 1][square] = PIECE_VALUES[piece_type] + table[square]
+        PST[piece_type + 5][square] = -(PIECE_VALUES[piece_type] + table[chess.square_mirror(square)])
+# PST_BY_COLOR[color][piece_type][square] for the per-move updates
+PST_BY_COLOR = [
+    [[0] * 64] + [PST[piece_type - 1 + (0 if color else 6)] for piece_type in chess.PIECE_TYPES]
+    for color in (chess.BLACK, chess.WHITE)
+]
+
+def pst_score(board):
+    score = 0
+    for color in chess.COLORS:
+        tables = PST_BY_COLOR[color]
+        for square in chess.scan_forward(board.occupied_co[color]):
+            score += tables[board.piece_type_at(square)][square]
+    return score
+
+MOBILITY_WEIGHT = 5
+
+def attack_mobility(board, color):
+    # Pseudo-legal mobility: squares attacked by knights, bishops, rooks and
+    # queens that are not occupied by their own side
+    own = board.occupied_co[color]
+    mobility = 0
+    for square in chess.scan_forward(own & ~board.pawns & ~board.kings):
+        mobility += chess.popcount(board.attacks_mask(square) & ~own)
+    return mobility
+
+# --- Quiescence search ---
+# A capture has to be able to lift the score to within this margin of alpha
+DELTA_MARGIN = 200
+
+def mvv_lva(board, move):
+    # Most valuable victim first, least valuable attacker breaks ties
+    if board.is_en_passant(move):
+        victim = chess.PAWN
+    else:
+        victim = board.piece_type_at(move.to_square) or 0
+    score = 10 * victim - board.piece_type_at(move.from_square)
+    if move.promotion:
+        score += 10 * move.promotion
+    return score
+
+def capture_gain(board, move):
+    if board.is_en_passant(move):
+        gain = PIECE_VALUES[chess.PAWN]
+    else:
+        victim = board.piece_type_at(move.to_square)
+        gain = PIECE_VALUES[victim] if victim else 0
+    if move.promotion:
+        gain += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+    return gain
+
+# --- Selectivity ---
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+# Late move reductions apply from this move index and remaining depth on
+LMR_MIN_INDEX = 3
+LMR_MIN_DEPTH = 3
+
+# --- Move ordering ---
+# Cutoffs are counted per move index; the last bin collects everything later
+CUTOFF_INDEX_BINS = 16
+# Buckets of search time measured by MoonBot.enable_timing()
+SEARCH_TIMERS = ('movegen', 'eval', 'game_over')
+
+# --- Transposition table ---
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+class TranspositionTable:
+    # Fixed-size table of two-slot buckets: the first slot keeps the deepest
+    # entry (depth-preferred), the second is overwritten on every other store.
+    # Entries are (key, depth, flag, score, move, generation) tuples.
+    def __init__(self, size=1 << 18):
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.size = size
+        self.mask = size - 1
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.deep = [None] * size
+        self.recent = [None] * size
+
+    def clear(self):
+        self.generation = 0
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+
+    def new_search(self):
+        # Entries from older searches lose their depth preference
+        self.generation += 1
+        self.probes = 0
+        self.hits = 0
+
+    def hashfull(self):
+        # Permille of the first 1000 buckets holding an entry from the current search
+        sample = min(1000, self.size)
+        used = sum(1 for entry in self.deep[:sample] if entry is not None and entry[5] == self.generation)
+        return used * 1000 // sample
+
+    def probe(self, key):
+        self.probes += 1
+        index = key & self.mask
+        entry = self.deep[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.recent[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        entry = (key, depth, flag, score, move, self.generation)
+        deep = self.deep[index]
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            self.deep[index] = entry
+        else:
+            self.recent[index] = entry
+
+# Shared table entries are two 64-bit words, (key ^ data, data): a write
+# torn by another process fails the key check instead of returning another
+# position's data. data packs move (from | to << 6 | promotion << 12 in 18
+# bits), score + TT_SCORE_OFFSET (18 bits), depth (8), flag (2) and
+# generation (6). BitboardMoonBot packs its entries the same way and uses the
+# same depth-preferred replacement, so both engines can share one table.
+TT_SCORE_OFFSET = 1 << 17
+
+class SharedTranspositionTable:
+    # TranspositionTable over multiprocessing.shared_memory for Lazy SMP. One
+    # depth-preferred slot per key; no locks. The coordinator owns the
+    # generation: new_search() does not bump it, every helper sets it instead.
+    def __init__(self, size=1 << 20, name=None):
+        from multiprocessing import shared_memory
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.size = size
+        self.mask = size - 1
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=16 * size)
+        self.name = self.shm.name
+        self.words = self.shm.buf.cast('Q')
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        if self.owner:
+            self.clear()
+
+    def clear(self):
+        self.shm.buf[:16 * self.size] = bytes(16 * self.size)
+
+    def new_search(self):
+        self.probes = 0
+        self.hits = 0
+
+    def hashfull(self):
+        sample = min(1000, self.size)
+        words = self.words
+        used = sum(1 for i in range(sample) if words[2 * i + 1])
+        return used * 1000 // sample
+
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self.mask) << 1
+        data = self.words[index + 1]
+        if not data or self.words[index] ^ data != key:
+            return None
+        self.hits += 1
+        raw = data & 0x3FFFF
+        move = chess.Move(raw & 63, (raw >> 6) & 63, (raw >> 12) or None) if raw else None
+        return (key, (data >> 36) & 0xFF, (data >> 44) & 3, ((data >> 18) & 0x3FFFF) - TT_SCORE_OFFSET, move, data >> 46)
+
+    def store(self, key, depth, flag, score, move):
+        index = (key & self.mask) << 1
+        old = self.words[index + 1]
+        if old and self.words[index] ^ old != key and depth < (old >> 36) & 0xFF and old >> 46 == self.generation & 63:
+            return
+        raw = move.from_square | move.to_square << 6 | (move.promotion or 0) << 12 if move else 0
+        data = (raw | (int(score) + TT_SCORE_OFFSET) << 18 | min(max(depth, 0), 255) << 36 | flag << 44
+                | (self.generation & 63) << 46)
+        self.words[index + 1] = data
+        self.words[index] = key ^ data
+
+    def close(self):
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
 class MoonBot:
-    def __init__(self):
+    # mobility='attacks' scores mobility from attack bitboards and leaves
+    # mate/stalemate detection to the search; 'legal' is the original
+    # legal-move-count term
+    # position_cache: a PositionCache or the path of one, consulted by
+    # get_best_move() before searching
+    # tablebases: a Tablebases or its directory, probed at the root and in the search
+    def __init__(self, mobility='attacks', position_cache=None, tablebases=None, profile=None, profile_pstats=False):
+        if mobility not in ('attacks', 'legal'):
+            raise ValueError(f"Unknown mobility mode: {mobility}")
+        self.mobility = mobility
+        if isinstance(position_cache, str):
+            position_cache = PositionCache(position_cache)
+        self.position_cache = position_cache
+        if isinstance(tablebases, str):
+            tablebases = Tablebases(tablebases)
+        self.tablebases = tablebases
         if BitboardMoonBot is not None:
-            self.engine = BitboardMoonBot()
+            self.engine = BitboardMoonBot(PST)
+            if tablebases is not None:
+                # The compiled search probes through the same tables at interior nodes
+                self.engine.tb_probe = lambda fen, ply: tablebases.score(chess.Board(fen), ply)
+                self.engine.tb_pieces = tablebases.max_pieces
         else:
             self.engine = None
         self.board = chess.Board()
+        # Both tables persist across moves; call new_game() between games
+        self.tt = TranspositionTable()
+        self.bitboard_tt = TranspositionTable()
+        self._piece_keys = [ZOBRIST.hash_board(self.board)]
+        self._psqt = [pst_score(self.board)]
+        self.nodes = 0
+        self.pv = []
+        self._follow_pv = False
+        self._deadline = None
+        # Any object with is_set() (e.g. a multiprocessing.Event); aborts the search when set
+        self.stop_event = None
+        self.killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        # History scores indexed by from_square * 64 + to_square
+        self.history = [0] * 4096
+        self.cutoff_counts = [0] * CUTOFF_INDEX_BINS
+        self.qnodes = 0
+        self.evals = 0
+        self.search_depth = 0
+        # Seconds per SEARCH_TIMERS bucket, or None while timing is off
+        self.search_times = None
+        self._active_timers = set()
+        self.last_stats = None
+        # Directory for a stats JSON file (and a cProfile dump with profile_pstats) per search
+        self.profile = profile
+        self.profile_pstats = profile_pstats
+        self.searches = 0
+        if profile is not None:
+            self.enable_timing()
+        self._search_tt = self.tt
+        self._material_only = False
+        # Full Zobrist keys of the current search path by ply, and of the game before the root
+        self._ply_keys = [0] * (MAX_SEARCH_DEPTH + 1)
+        self._game_keys = []
+        # Set by Lazy SMP helpers to vary the root move order
+        self.root_rotation = 0
 
-    def make_move(self, move_uci):
+    def new_game(self):
+        self.board = chess.Board()
         if self.engine is not None:
-            # TODO: update bitboard engine state
-            pass
+            self.engine.set_fen(self.board.fen())
+            self.engine.clear()
+        self.tt.clear()
+        self.bitboard_tt.clear()
+        self.history = [0] * 4096
+        self._sync()
+
+    def _new_search(self, tt, material_only=False):
+        self._sync()
+        tt.new_search()
+        self._search_tt = tt
+        self._material_only = material_only
+        self._game_keys = self._history_keys()
+        self.nodes = 0
+        self._follow_pv = False
+        self._deadline = None
+        self.killers = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        # History carries over between moves but decays
+        self.history = [score >> 1 for score in self.history]
+        self.cutoff_counts = [0] * CUTOFF_INDEX_BINS
+        self.qnodes = 0
+        self.evals = 0
+        if self.search_times is not None:
+            for timer in SEARCH_TIMERS:
+                self.search_times[timer] = 0.0
+
+    def enable_timing(self):
+        # Time move generation, evaluation and game-over checks of the Python
+        # search. Only this instance's methods are wrapped, so other bots pay nothing.
+        if self.search_times is not None:
+            return
+        self.search_times = dict.fromkeys(SEARCH_TIMERS, 0.0)
+        self._pick_moves = self._timed_moves(self._pick_moves)
+        self._tactical_moves = self._timed('movegen', self._tactical_moves)
+        self._static_eval = self._timed('eval', self._static_eval)
+        self._draw_by_rule = self._timed('game_over', self._draw_by_rule)
+
+    def _timed(self, timer, func):
+        times, active = self.search_times, self._active_timers
+        def timed(*args):
+            # Nested calls (the move picker generating captures) are counted once
+            if timer in active:
+                return func(*args)
+            active.add(timer)
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                times[timer] += time.perf_counter() - start
+                active.discard(timer)
+        return timed
+
+    def _timed_moves(self, pick_moves):
+        # The move picker is a generator, so each step is timed instead of the call
+        timed_next = self._timed('movegen', next)
+        def timed(*args):
+            moves = pick_moves(*args)
+            while True:
+                move = timed_next(moves, None)
+                if move is None:
+                    return
+                yield move
+        return timed
+
+    def _should_stop(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        return self._deadline is not None and time.monotonic() > self._deadline
+
+    def _sync(self):
+        # Re-seed the incremental hash and score after self.board was changed outside a search
+        self._piece_keys = [ZOBRIST.hash_board(self.board)]
+        self._psqt = [pst_score(self.board)]
+
+    def zobrist_key(self):
+        board = self.board
+        return self._piece_keys[-1] ^ ZOBRIST.hash_castling(board) ^ ZOBRIST.hash_ep_square(board) ^ ZOBRIST.hash_turn(board)
+
+    def _push(self, move):
+        # board.push() that keeps the piece part of the Zobrist key and the
+        # material + PST score up to date
+        board = self.board
+        us = board.turn
+        from_sq, to_sq = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_sq)
+        ours, theirs = ZOBRIST_PIECES[us], ZOBRIST_PIECES[not us]
+        our_pst, their_pst = PST_BY_COLOR[us], PST_BY_COLOR[not us]
+        key = self._piece_keys[-1] ^ ours[piece_type][from_sq]
+        score = self._psqt[-1] - our_pst[piece_type][from_sq]
+        if piece_type == chess.KING and board.is_castling(move):
+            rank = from_sq & 56
+            if chess.square_file(to_sq) > chess.square_file(from_sq):
+                king_to, rook_from, rook_to = rank + 6, rank + 7, rank + 5
+            else:
+                king_to, rook_from, rook_to = rank + 2, rank, rank + 3
+            key ^= ours[chess.KING][king_to] ^ ours[chess.ROOK][rook_from] ^ ours[chess.ROOK][rook_to]
+            score += our_pst[chess.KING][king_to] - our_pst[chess.ROOK][rook_from] + our_pst[chess.ROOK][rook_to]
+        else:
+            to_type = move.promotion or piece_type
+            key ^= ours[to_type][to_sq]
+            score += our_pst[to_type][to_sq]
+            if piece_type == chess.PAWN and to_sq == board.ep_square:
+                captured_sq = to_sq - 8 if us == chess.WHITE else to_sq + 8
+                key ^= theirs[chess.PAWN][captured_sq]
+                score -= their_pst[chess.PAWN][captured_sq]
+            else:
+                captured = board.piece_type_at(to_sq)
+                if captured:
+                    key ^= theirs[captured][to_sq]
+                    score -= their_pst[captured][to_sq]
+        board.push(move)
+        self._piece_keys.append(key)
+        self._psqt.append(score)
+
+    def _pop(self):
+        self._piece_keys.pop()
+        self._psqt.pop()
+        return self.board.pop()
+
+    def _pick_moves(self, hash_moves, ply):
+        # Staged move picker: hash/PV move, winning captures and promotions,
+        # killers, quiets by history, then losing captures. A stage is only
+        # generated if the moves before it did not cut off.
+        board = self.board
+        tried = []
+        for move in hash_moves:
+            if move is not None and move not in tried and board.is_legal(move):
+                tried.append(move)
+                yield move
+        them = not board.turn
+        losing = []
+        for move in self._tactical_moves():
+            if move in tried:
+                continue
+            if move.promotion or capture_gain(board, move) >= PIECE_VALUES[board.piece_type_at(move.from_square)] or not board.is_attacked_by(them, move.to_square):
+                yield move
+            else:
+                losing.append(move)
+        for move in self.killers[ply]:
+            if move is not None and move not in tried and not board.is_capture(move) and board.is_legal(move):
+                tried.append(move)
+                yield move
+        history = self.history
+        quiets = [move for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[them])
+                  if not move.promotion and not board.is_en_passant(move) and move not in tried]
+        quiets.sort(key=lambda move: history[move.from_square * 64 + move.to_square], reverse=True)
+        if not ply and self.root_rotation and quiets:
+            # Lazy SMP helpers each try the root's quiet moves in a different order
+            rotation = self.root_rotation % len(quiets)
+            quiets = quiets[rotation:] + quiets[:rotation]
+        yield from quiets
+        yield from losing
+
+    def _record_cutoff(self, move, depth, ply, index):
+        self.cutoff_counts[min(index, CUTOFF_INDEX_BINS - 1)] += 1
+        if move.promotion or self.board.is_capture(move):
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move.from_square * 64 + move.to_square] += depth * depth
+
+    def ordering_stats(self, cutoff_counts=None):
+        # Cutoff statistics of the last search, to check move ordering quality
+        if cutoff_counts is None:
+            cutoff_counts = self.cutoff_counts
+        cutoffs = sum(cutoff_counts)
+        return {
+            'cutoffs': cutoffs,
+            'first_move_cutoff_pct': 100.0 * cutoff_counts[0] / cutoffs if cutoffs else 0.0,
+            'cutoffs_by_index': list(cutoff_counts),
+        }
+
+    def search_stats(self, source='python', elapsed=0.0):
+        # Counters of the last search as a JSON-ready dict. source is where the
+        # move came from: 'python', 'engine', 'cache' or 'tablebase'.
+        if source == 'engine':
+            engine = self.engine
+            nodes, qnodes, evals = engine.nodes, engine.qnodes, engine.evals
+            probes, hits = engine.tt_probes, engine.tt_hits
+            ordering = self.ordering_stats(engine.cutoffs_by_index())
+            times = None
+        elif source == 'python':
+            nodes, qnodes, evals = self.nodes, self.qnodes, self.evals
+            probes, hits = self._search_tt.probes, self._search_tt.hits
+            ordering = self.ordering_stats()
+            times = {timer: round(seconds, 4) for timer, seconds in self.search_times.items()} if self.search_times else None
+        else:
+            nodes = qnodes = evals = probes = hits = 0
+            ordering = self.ordering_stats([0] * CUTOFF_INDEX_BINS)
+            times = None
+        stats = _bench_row(nodes, elapsed, source=source, depth=self.search_depth, qnodes=qnodes, evals=evals,
+                           tt_probes=probes, tt_hits=hits, tt_hit_rate=round(hits / probes, 4) if probes else 0.0)
+        stats.update(ordering)
+        stats['times'] = times
+        return stats
+
+    def from_fen(self, fen):
+        self.board = chess.Board(fen)
+        if self.engine is not None:
+            self.engine.set_fen(fen)
+        self._sync()
+
+    def _sync_engine(self):
+        # self.board may have been pushed to directly (e.g. by the pygame UI);
+        # fall back to the FEN when the compiled engine's hash disagrees
+        if self.engine.zobrist_key() != chess.polyglot.zobrist_hash(self.board):
+            self.engine.set_fen(self.board.fen())
+
+    def make_move(self, move_uci):
         try:
             move = chess.Move.from_uci(move_uci)
             if move in self.board.legal_moves:
+                if self.engine is not None:
+                    self._sync_engine()
+                    self.engine.push_uci(move.uci())
                 self.board.push(move)
                 return True
             else:
@@ -34,134 +606,356 @@ class MoonBot:
 
     def evaluate_board(self):
         # Improved evaluation: material, piece-square tables, mobility, and checkmate
-        values = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
-        # Piece-square tables (simplified, for white; black is mirrored)
-        pawn_table = [
-            0, 5, 5, 0, 5, 10, 50, 0,
-            0, 10, -5, 0, 5, 10, 50, 0,
-            0, 10, -10, 0, 10, 20, 50, 0,
-            0, -20, 0, 20, 25, 30, 50, 0,
-            0, -20, 0, 20, 25, 30, 50, 0,
-            0, 10, -10, 0, 10, 20, 50, 0,
-            0, 10, -5, 0, 5, 10, 50, 0,
-            0, 5, 5, 0, 5, 10, 50, 0
-        ]
-        knight_table = [
-            -50, -40, -30, -30, -30, -30, -40, -50,
-            -40, -20, 0, 0, 0, 0, -20, -40,
-            -30, 0, 10, 15, 15, 10, 0, -30,
-            -30, 5, 15, 20, 20, 15, 5, -30,
-            -30, 0, 15, 20, 20, 15, 0, -30,
-            -30, 5, 10, 15, 15, 10, 5, -30,
-            -40, -20, 0, 5, 5, 0, -20, -40,
-            -50, -40, -30, -30, -30, -30, -40, -50
-        ]
-        bishop_table = [
-            -20, -10, -10, -10, -10, -10, -10, -20,
-            -10, 0, 0, 0, 0, 0, 0, -10,
-            -10, 0, 5, 10, 10, 5, 0, -10,
-            -10, 5, 5, 10, 10, 5, 5, -10,
-            -10, 0, 10, 10, 10, 10, 0, -10,
-            -10, 10, 10, 10, 10, 10, 10, -10,
-            -10, 5, 0, 0, 0, 0, 5, -10,
-            -20, -10, -10, -10, -10, -10, -10, -20
-        ]
-        rook_table = [
-            0, 0, 0, 0, 0, 0, 0, 0,
-            5, 10, 10, 10, 10, 10, 10, 5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            0, 0, 0, 5, 5, 0, 0, 0
-        ]
-        queen_table = [
-            -20, -10, -10, -5, -5, -10, -10, -20,
-            -10, 0, 0, 0, 0, 0, 0, -10,
-            -10, 0, 5, 5, 5, 5, 0, -10,
-            -5, 0, 5, 5, 5, 5, 0, -5,
-            0, 0, 5, 5, 5, 5, 0, -5,
-            -10, 5, 5, 5, 5, 5, 0, -10,
-            -10, 0, 5, 0, 0, 0, 0, -10,
-            -20, -10, -10, -5, -5, -10, -10, -20
-        ]
-        king_table = [
-            20, 30, 10, 0, 0, 10, 30, 20,
-            20, 20, 0, 0, 0, 0, 20, 20,
-            -10, -20, -20, -20, -20, -20, -20, -10,
-            -20, -30, -30, -40, -40, -30, -30, -20,
-            -30, -40, -40, -50, -50, -40, -40, -30,
-            -30, -40, -40, -50, -50, -40, -40, -30,
-            -30, -40, -40, -50, -50, -40, -40, -30,
-            -30, -40, -40, -50, -50, -40, -40, -30
-        ]
-        tables = {
-            chess.PAWN: pawn_table,
-            chess.KNIGHT: knight_table,
-            chess.BISHOP: bishop_table,
-            chess.ROOK: rook_table,
-            chess.QUEEN: queen_table,
-            chess.KING: king_table
-        }
-        eval = 0
-        for piece_type in values:
-            for square in self.board.pieces(piece_type, chess.WHITE):
-                eval += values[piece_type]
-                eval += tables[piece_type][square]
-            for square in self.board.pieces(piece_type, chess.BLACK):
-                eval -= values[piece_type]
-                eval -= tables[piece_type][chess.square_mirror(square)]
+        self._sync()
+        return self._evaluate()
+
+    def _evaluate(self):
+        # Material and piece-square score is kept incrementally by _push/_pop
+        eval = self._psqt[-1]
+        if self.mobility == 'attacks':
+            board = self.board
+            eval += MOBILITY_WEIGHT * (attack_mobility(board, chess.WHITE) - attack_mobility(board, chess.BLACK))
+            return eval
         # Mobility (number of legal moves)
         eval += 5 * (self.board.legal_moves.count() if self.board.turn == chess.WHITE else -self.board.legal_moves.count())
         # Checkmate/stalemate
         if self.board.is_checkmate():
-            eval = -99999 if self.board.turn == chess.WHITE else 99999
+            eval = -MATE_SCORE if self.board.turn == chess.WHITE else MATE_SCORE
         elif self.board.is_stalemate():
             eval = 0
         return eval
 
     def minimax(self, depth, alpha, beta, maximizing):
-        if depth == 0 or self.board.is_game_over():
-            return self.evaluate_board(), None
-        best_move = None
+        # Kept for callers of the original API: scores are from White's point of
+        # view. maximizing must match the side to move, as in get_best_move().
+        self._new_search(self.tt)
         if maximizing:
-            max_eval = float('-inf')
-            for move in self.board.legal_moves:
-                self.board.push(move)
-                eval, _ = self.minimax(depth-1, alpha, beta, False)
-                self.board.pop()
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, eval)
-                if beta <= alpha:
+            return self._negamax(depth, alpha, beta, 0)
+        score, move = self._negamax(depth, -beta, -alpha, 0)
+        return -score, move
+
+    def _draw_by_rule(self, key, ply):
+        # Draws that do not need the move list; mate and stalemate are found by
+        # the search. Any repetition inside the tree or of a game position
+        # counts as a draw, so a winning side does not repeat its way into one.
+        # The 50-move rule is the one the compiled engine and run_match() apply.
+        board = self.board
+        if board.halfmove_clock >= 100 or board.is_insufficient_material():
+            return True
+        # Earlier positions with the same side to move, back to the last
+        # irreversible move or, inside the tree, the last null move (never
+        # played at the root, so the moves checked here cover the whole path)
+        game_keys = self._game_keys
+        stack = board.move_stack
+        for back in range(2, board.halfmove_clock + 1, 2):
+            if back <= ply:
+                if not stack[-back] or not stack[1 - back]:
                     break
-            return max_eval, best_move
-        else:
-            min_eval = float('inf')
-            for move in self.board.legal_moves:
-                self.board.push(move)
-                eval, _ = self.minimax(depth-1, alpha, beta, True)
-                self.board.pop()
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, eval)
-                if beta <= alpha:
+                earlier = self._ply_keys[ply - back]
+            elif back - ply <= len(game_keys):
+                earlier = game_keys[ply - back]
+            else:
+                break
+            if earlier == key:
+                return True
+        return False
+
+    def _history_keys(self):
+        # Keys of the game positions before the root since the last irreversible move, oldest first
+        board = self.board.copy()
+        keys = []
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            board.pop()
+            keys.append(ZOBRIST(board))
+        keys.reverse()
+        return keys
+
+    def _static_eval(self):
+        # Side-to-move point of view, as negamax needs
+        self.evals += 1
+        score = self.bitboard_eval() if self._material_only else self._evaluate()
+        return score if self.board.turn == chess.WHITE else -score
+
+    def _push_null(self):
+        self.board.push(chess.Move.null())
+        self._piece_keys.append(self._piece_keys[-1])
+        self._psqt.append(self._psqt[-1])
+
+    def _negamax(self, depth, alpha, beta, ply, allow_null=True):
+        # Principal variation search; scores are from the side to move's point of view
+        self.nodes += 1
+        if not self.nodes & 255 and self._should_stop():
+            raise SearchTimeout()
+        board = self.board
+        key = self.zobrist_key()
+        self._ply_keys[ply] = key
+        if ply and self._draw_by_rule(key, ply):
+            return 0, None
+        if ply and self.tablebases is not None:
+            score = self.tablebases.score(board, ply)
+            if score is not None:
+                return score, None
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply, True), None
+        pv_node = beta - alpha > 1
+        tt = self._search_tt
+        entry = tt.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                flag, score = entry[2], score_from_tt(entry[3], ply)
+                if flag == TT_EXACT:
+                    return score, tt_move
+                if flag == TT_LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score, tt_move
+        alpha_orig = alpha
+        in_check = board.is_check()
+        # Null move pruning. Skipped when the side to move only has pawns left,
+        # where passing may be better than any move (zugzwang).
+        if (allow_null and not pv_node and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+                and board.occupied_co[board.turn] & ~(board.pawns | board.kings)
+                and self._static_eval() >= beta):
+            reduction = NULL_MOVE_REDUCTION + (depth >= 6)
+            self._push_null()
+            score = -self._negamax(depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)[0]
+            self._pop()
+            if score >= beta:
+                # Unproven mates from a null-move search are not trusted
+                return (beta if score >= MATE_BOUND else score), None
+        # The previous iteration's PV is searched first while we are still on it
+        pv_move = None
+        if self._follow_pv:
+            if ply < len(self.pv):
+                pv_move = self.pv[ply]
+            else:
+                self._follow_pv = False
+        killers = self.killers[ply]
+        best_score = float('-inf')
+        best_move = None
+        for index, move in enumerate(self._pick_moves((pv_move, tt_move), ply)):
+            quiet = not move.promotion and not board.is_capture(move)
+            self._push(move)
+            if index == 0:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            else:
+                # Late quiet moves are searched shallower first
+                reduction = 0
+                if (depth >= LMR_MIN_DEPTH and index >= LMR_MIN_INDEX and quiet and not in_check
+                        and move not in killers and not board.is_check()):
+                    reduction = 1 + (depth >= 6 and index >= 2 * LMR_MIN_INDEX)
+                # Null window: only prove the move is no better than alpha
+                score = -self._negamax(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)[0]
+                if score > alpha and reduction:
+                    score = -self._negamax(depth - 1, -alpha - 1, -alpha, ply + 1)[0]
+                if alpha < score < beta:
+                    score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            self._pop()
+            self._follow_pv = False
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    self._record_cutoff(move, depth, ply, index)
                     break
-            return min_eval, best_move
+        if best_move is None:
+            # No legal moves: checkmate or stalemate
+            return (-(MATE_SCORE - ply) if in_check else 0), None
+        if best_score <= alpha_orig:
+            flag = TT_UPPER
+        elif best_score >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        tt.store(key, depth, flag, score_to_tt(best_score, ply), best_move)
+        return best_score, best_move
+
+    def _tactical_moves(self):
+        # Captures and promotions, MVV-LVA ordered
+        board = self.board
+        promotion_rank = chess.BB_RANK_7 if board.turn == chess.WHITE else chess.BB_RANK_2
+        moves = list(board.generate_legal_captures())
+        moves.extend(board.generate_legal_moves(board.pawns & board.occupied_co[board.turn] & promotion_rank, ~board.occupied))
+        moves.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+        return moves
+
+    def _quiescence(self, alpha, beta, ply, evasions=False):
+        # Capture-only extension of the leaves; the side to move may "stand pat"
+        # on the static eval. A leaf that is in check searches all evasions first
+        # so mates at the horizon are seen; deeper checks are not extended.
+        self.nodes += 1
+        self.qnodes += 1
+        if not self.nodes & 255 and self._should_stop():
+            raise SearchTimeout()
+        board = self.board
+        if evasions and board.is_check():
+            moves = list(board.legal_moves)
+            if not moves:
+                return -(MATE_SCORE - ply)
+            best = float('-inf')
+            stand_pat = None
+        else:
+            stand_pat = self._static_eval()
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            best = stand_pat
+            moves = self._tactical_moves()
+        for move in moves:
+            if stand_pat is not None:
+                # Delta pruning: even winning the piece cannot reach alpha
+                gain = capture_gain(board, move)
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                # A bigger piece taking a defended smaller one loses material outright
+                if not move.promotion and gain < PIECE_VALUES[board.piece_type_at(move.from_square)] and board.is_attacked_by(not board.turn, move.to_square):
+                    continue
+            self._push(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            self._pop()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
 
-    def get_best_move(self, depth=3):
+    def get_best_move(self, depth=3, movetime_ms=None, max_depth=None, on_iteration=None, on_stats=None,
+                      return_stats=False):
+        # With movetime_ms, deepen until the deadline (or max_depth) and return
+        # the best move of the last completed iteration.
+        # on_iteration(depth, score, pv, nodes) reports each completed depth (pv as UCI strings),
+        # on_stats(stats) the search_stats() so far. With return_stats, returns (move, stats).
+        profiler = None
+        if self.profile is not None and self.profile_pstats:
+            import cProfile
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            move, source = self._search_best_move(depth, movetime_ms, max_depth, on_iteration, on_stats, start)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        self.last_stats = self.search_stats(source, time.perf_counter() - start)
+        if self.profile is not None:
+            self._write_profile(self.last_stats, profiler)
+        return (move, self.last_stats) if return_stats else move
+
+    def _search_best_move(self, depth, movetime_ms, max_depth, on_iteration, on_stats, start):
+        # Returns (move as UCI or None, source for search_stats())
+        if max_depth is None:
+            max_depth = depth if movetime_ms is None else MAX_SEARCH_DEPTH
+        self.search_depth = 0
+        if self.position_cache is not None:
+            # Timed searches take any searched entry, but never one of unknown (0) depth
+            move = self._cached_move(max_depth if movetime_ms is None else 1)
+            if move is not None:
+                return move, 'cache'
+        if self.tablebases is not None:
+            move = self.tablebases.best_move(self.board)
+            if move is not None:
+                return move.uci(), 'tablebase'
+        source = 'python' if self.engine is None else 'engine'
+        if on_stats is not None:
+            report = on_iteration
+
+            def on_iteration(depth, score, pv, nodes):
+                self.search_depth = depth
+                if report is not None:
+                    report(depth, score, pv, nodes)
+                on_stats(self.search_stats(source, time.perf_counter() - start))
         if self.engine is not None:
-            score, move = self.engine.negamax(depth, -100000, 100000)
-            return move
-        _, move = self.minimax(depth, float('-inf'), float('inf'), self.board.turn)
-        return move.uci() if move else None
+            self._sync_engine()
+            self.engine.stop_event = self.stop_event
+            _, move, self.search_depth = self.engine.iterative_deepening(max_depth, movetime_ms or 0, on_iteration)
+            return move, source
+        _, move = self.iterative_deepening(max_depth, movetime_ms, on_iteration)
+        return (move.uci() if move else None), source
+
+    def _write_profile(self, stats, profiler):
+        os.makedirs(self.profile, exist_ok=True)
+        self.searches += 1
+        path = os.path.join(self.profile, f'search-{os.getpid()}-{self.searches:04d}')
+        with open(path + '.json', 'w') as f:
+            json.dump(dict(stats, fen=self.board.fen()), f, indent=2)
+        if profiler is not None:
+            profiler.dump_stats(path + '.pstats')
+
+    def _cached_move(self, min_depth):
+        hit = self.position_cache.lookup(chess.polyglot.zobrist_hash(self.board))
+        if hit is None or hit[0] is None or hit[2] < min_depth:
+            return None
+        move = chess.Move.from_uci(hit[0])
+        return hit[0] if move in self.board.legal_moves else None
+
+    def iterative_deepening(self, max_depth, movetime_ms=None, on_iteration=None, depths=None):
+        # Returns (score, move); the score is from the side to move's point of view.
+        # Lazy SMP helpers pass their own depths (see smp_depths) to stagger their iterations.
+        self._new_search(self.tt)
+        self.pv = []
+        self.search_depth = 0
+        start = time.monotonic()
+        deadline = None if movetime_ms is None else start + movetime_ms / 1000
+        root_ply = len(self.board.move_stack)
+        best_score, best_move = None, None
+        for depth in range(1, max_depth + 1) if depths is None else depths:
+            self._follow_pv = True
+            try:
+                score, move = self._negamax(depth, float('-inf'), float('inf'), 0)
+            except SearchTimeout:
+                while len(self.board.move_stack) > root_ply:
+                    self.board.pop()
+                del self._piece_keys[1:]
+                del self._psqt[1:]
+                break
+            if move is None:
+                break
+            best_score, best_move = score, move
+            self.search_depth = depth
+            self.pv = self._extract_pv(depth)
+            if on_iteration is not None:
+                on_iteration(depth, score, [pv_move.uci() for pv_move in self.pv] or [move.uci()], self.nodes)
+            if abs(score) >= MATE_BOUND:
+                break
+            if deadline is not None:
+                # Depth 1 always completes; after that the clock may abort an iteration
+                self._deadline = deadline
+                # The next iteration would not finish in the time that is left
+                if time.monotonic() - start > (deadline - start) / 2:
+                    break
+        self._deadline = None
+        return best_score, best_move
+
+    def _extract_pv(self, depth):
+        pv = []
+        seen = set()
+        while len(pv) < depth:
+            key = self.zobrist_key()
+            entry = self._search_tt.probe(key)
+            if key in seen or entry is None or entry[4] is None or entry[4] not in self.board.legal_moves:
+                break
+            seen.add(key)
+            pv.append(entry[4])
+            self._push(entry[4])
+        for _ in pv:
+            self._pop()
+        return pv
 
     def print_board(self):
         print(self.board)
 
+    def hashfull(self):
+        return self.engine.hashfull() if self.engine is not None else self.tt.hashfull()
+
     def close(self):
         pass
 
@@ -185,53 +979,1604 @@ class MoonBot:
         return eval
 
     def bitboard_negamax(self, depth, alpha, beta):
-        if depth == 0 or self.board.is_game_over():
-            return self.bitboard_eval(), None
-        best_move = None
-        max_eval = float('-inf')
-        for move in self.board.legal_moves:
-            self.board.push(move)
-            eval, _ = self.bitboard_negamax(depth-1, -beta, -alpha)
-            eval = -eval
-            self.board.pop()
-            if eval > max_eval:
-                max_eval = eval
-                best_move = move
-            alpha = max(alpha, eval)
+        # Same search as get_best_move() on the material-only bitboard_eval,
+        # with its own transposition table
+        self._new_search(self.bitboard_tt, material_only=True)
+        return self._negamax(depth, alpha, beta, 0)
+
+    def evaluate_children(self, moves=None):
+        # Material + PST score after each move (default: every legal move), from
+        # the mover's point of view, with one evaluate_many() call for all of them
+        board = self.board
+        moves = list(board.legal_moves) if moves is None else list(moves)
+        masks = []
+        for move in moves:
+            board.push(move)
+            masks.append(board_masks(board))
+            board.pop()
+        scores = evaluate_masks(masks)
+        return moves, (scores if board.turn == chess.WHITE else -scores)
+
+    def batch_negamax(self, depth):
+        # Fast, shallow alpha-beta for labelling datasets: every node scores all
+        # of its children in one evaluate_children() call, which orders the
+        # moves and at depth 1 is the result. No quiescence, mobility or TT.
+        # Returns (score, move) from the side to move's point of view.
+        self.nodes = 0
+        return self._batch_negamax(depth, float('-inf'), float('inf'), 0)
+
+    def _batch_negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        board = self.board
+        moves, scores = self.evaluate_children()
+        if not moves:
+            return (-(MATE_SCORE - ply) if board.is_check() else 0), None
+        order = scores.argsort()[::-1]
+        if depth <= 1:
+            return int(scores[order[0]]), moves[order[0]]
+        best_score, best_move = float('-inf'), None
+        for index in order:
+            board.push(moves[index])
+            score = -self._batch_negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, moves[index]
+            alpha = max(alpha, score)
             if alpha >= beta:
                 break
-        return max_eval, best_move
+        return best_score, best_move
+
+# --- Batched evaluation ---
+# Positions scored per vectorized product; bounds the (N, 12, 64) planes to 12 MB
+EVAL_BATCH_SIZE = 16384
+_pst_weights = None
+
+def pst_weights():
+    # PST as a (12, 64) int32 array, built on first use
+    global _pst_weights
+    if _pst_weights is None:
+        import numpy as np
+        _pst_weights = np.array(PST, dtype=np.int32)
+    return _pst_weights
+
+def board_masks(board):
+    # The 12 piece bitboards in PST row order (white P..K, black p..k)
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+    return (board.pawns & white, board.knights & white, board.bishops & white,
+            board.rooks & white, board.queens & white, board.kings & white,
+            board.pawns & black, board.knights & black, board.bishops & black,
+            board.rooks & black, board.queens & black, board.kings & black)
+
+FEN_PIECE_ROWS = {symbol: row for row, symbol in enumerate('PNBRQKpnbrqk')}
+
+def fen_masks(fen):
+    # board_masks() read straight from the FEN's placement field, several
+    # times faster than parsing a chess.BaseBoard
+    masks = [0] * 12
+    square = 56
+    for char in fen.split(' ', 1)[0]:
+        if char == '/':
+            square -= 16
+        elif char.isdigit():
+            square += int(char)
+        else:
+            masks[FEN_PIECE_ROWS[char]] |= 1 << square
+            square += 1
+    return masks
+
+def piece_masks(boards):
+    # (N, 12) uint64 array of board_masks() for chess.Board objects or FENs
+    import numpy as np
+    rows = [fen_masks(board) if isinstance(board, str) else board_masks(board) for board in boards]
+    return np.array(rows, dtype=np.uint64).reshape(len(rows), 12)
+
+def bit_planes(masks):
+    # (N, 12, 64) uint8 planes; bit n of a mask is square n
+    import numpy as np
+    masks = np.ascontiguousarray(masks, dtype='<u8').reshape(-1, 12)
+    return np.unpackbits(masks.view(np.uint8), axis=1, bitorder='little').reshape(len(masks), 12, 64)
+
+def evaluate_masks(masks):
+    # Material + PST of (N, 12) piece masks from White's point of view, as an
+    # int32 array: the planes times the (12, 64) weights, EVAL_BATCH_SIZE rows at a time
+    import numpy as np
+    masks = np.asarray(masks, dtype=np.uint64).reshape(-1, 12)
+    weights = pst_weights()
+    scores = np.empty(len(masks), dtype=np.int32)
+    for start in range(0, len(masks), EVAL_BATCH_SIZE):
+        planes = bit_planes(masks[start:start + EVAL_BATCH_SIZE])
+        scores[start:start + len(planes)] = np.einsum('nij,ij->n', planes, weights)
+    return scores
+
+def evaluate_many(boards):
+    # pst_score() of many chess.Board objects or FENs at once
+    return evaluate_masks(piece_masks(boards))
+
+# --- Benchmarks ---
+# Standard perft positions with known node counts per depth
+PERFT_SUITE = [
+    ('startpos', chess.STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),
+    ('rook-endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333]),
+    ('talkchess', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+]
+# Fixed-depth search positions: openings, middlegames, tactics and endgames
+BENCH_FENS = [
+    chess.STARTING_FEN,
+    'r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3',
+    'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    '2r3k1/pp3ppp/2n5/3p4/3P4/2P2N2/P4PPP/4R1K1 w - - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+    '8/8/4k3/8/2K5/3R4/8/8 w - - 0 1',
+]
+
+def perft(board, depth):
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+def _bench_row(nodes, elapsed, **fields):
+    fields.update(nodes=nodes, time=round(elapsed, 4), nps=int(nodes / elapsed) if elapsed > 0 else 0)
+    return fields
+
+def run_bench(search_depth=4, perft_depth=3, engines=('python', 'cython')):
+    # Perft and fixed-depth search results for each engine path, as a dict
+    # ready for json.dump; perft mismatches are flagged with 'ok': False.
+    # Progress goes to stderr so stdout can carry the JSON alone.
+    results = {}
+    for engine in engines:
+        if engine == 'cython' and BitboardMoonBot is None:
+            print("[MoonBot] Cython engine not built, skipping its benchmark.", file=sys.stderr)
+            continue
+        bot = MoonBot()
+        cengine = BitboardMoonBot(PST) if engine == 'cython' else None
+        perft_rows = []
+        for name, fen, counts in PERFT_SUITE:
+            depth = min(perft_depth, len(counts))
+            start = time.perf_counter()
+            if cengine is not None:
+                cengine.set_fen(fen)
+                nodes = cengine.perft(depth)
+            else:
+                nodes = perft(chess.Board(fen), depth)
+            elapsed = time.perf_counter() - start
+            perft_rows.append(_bench_row(nodes, elapsed, name=name, depth=depth, expected=counts[depth - 1], ok=nodes == counts[depth - 1]))
+            print(f"[{engine}] perft {name} d{depth}: {nodes} nodes {'OK' if perft_rows[-1]['ok'] else 'MISMATCH'} ({perft_rows[-1]['nps']} nps)", file=sys.stderr)
+        search_rows = []
+        for fen in BENCH_FENS:
+            # Every position starts from an empty transposition table
+            if cengine is not None:
+                cengine.clear()
+                cengine.set_fen(fen)
+            else:
+                bot.new_game()
+                bot.from_fen(fen)
+            start = time.perf_counter()
+            if cengine is not None:
+                score, move, depth = cengine.iterative_deepening(search_depth, 0)
+                nodes, probes, hits = cengine.nodes, cengine.tt_probes, cengine.tt_hits
+            else:
+                score, move = bot.iterative_deepening(search_depth)
+                move = move.uci() if move else None
+                depth, nodes, probes, hits = bot.search_depth, bot.nodes, bot.tt.probes, bot.tt.hits
+            elapsed = time.perf_counter() - start
+            row = _bench_row(nodes, elapsed, fen=fen, depth=depth, move=move, score=score,
+                             ebf=round(nodes ** (1 / depth), 2) if depth else 0.0,
+                             tt_hit_rate=round(hits / probes, 4) if probes else 0.0)
+            search_rows.append(row)
+            print(f"[{engine}] search d{depth} {move} ({score}) {nodes} nodes {row['time']}s {row['nps']} nps ebf {row['ebf']} tt {row['tt_hit_rate']:.1%}", file=sys.stderr)
+        total_nodes = sum(row['nodes'] for row in search_rows)
+        total_time = sum(row['time'] for row in search_rows)
+        results[engine] = {
+            'perft': perft_rows,
+            'search': search_rows,
+            'search_nodes': total_nodes,
+            'search_time': round(total_time, 4),
+            'search_nps': int(total_nodes / total_time) if total_time > 0 else 0,
+        }
+    return results
 
 # --- Background move generation for cache ---
-def generate_move_cache(depth=9, cache_file='move_sim_cache.json', max_positions=100000):
-    bot = MoonBot()
+def load_move_cache(cache_file):
+    # Older caches map FEN -> UCI string; newer ones FEN -> {'move', 'cp'}.
+    # Entries journaled by an interrupted generate_move_cache() are replayed on top.
+    journal_file = cache_file + '.journal'
     cache = {}
-    visited = set()
-    q = [(bot.board.fen(), bot.board.copy())]
-    count = 0
-    while q and count < max_positions:
-        fen, board = q.pop(0)
-        if fen in visited:
+    if os.path.exists(cache_file) or not os.path.exists(journal_file):
+        with open(cache_file) as f:
+            cache = json.load(f)
+    for fen, value in cache.items():
+        if not isinstance(value, dict):
+            cache[fen] = {'move': value, 'cp': None}
+    if os.path.exists(journal_file):
+        with open(journal_file) as f:
+            for line in f:
+                try:
+                    fen, entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+                cache[fen] = entry
+    return cache
+
+def save_move_cache(cache, cache_file):
+    # Write to a temporary file first so a crash never leaves a truncated cache
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, cache_file)
+
+# --- Binary position cache ---
+# Layout: 16-byte header (magic, record count), then the records as columns
+# sorted by key: keys u64[n], packed moves u16[n], scores i16[n], depths u8[n].
+# The key column is memory-mapped and binary-searched, so opening a cache is
+# O(1) and only the pages touched by lookups become resident.
+POSITION_CACHE_MAGIC = b'MOONPC01'
+POSITION_CACHE_FILE = 'move_sim_cache.bin'
+
+def pack_move(move):
+    # from | to << 6 | (promotion piece type - 1) << 12; 0 means no move
+    if move is None:
+        return 0
+    return move.from_square | move.to_square << 6 | ((move.promotion - 1) << 12 if move.promotion else 0)
+
+def unpack_move(packed):
+    if not packed:
+        return None
+    promotion = packed >> 12
+    return chess.Move(packed & 63, (packed >> 6) & 63, promotion + 1 if promotion else None)
+
+def write_position_cache(records, path):
+    # records: iterable of (zobrist key, chess.Move or None, score, depth);
+    # for duplicate keys the deepest record wins
+    import numpy as np
+    best = {}
+    for key, move, score, depth in records:
+        if key not in best or depth > best[key][2]:
+            best[key] = (pack_move(move), max(-32767, min(32767, score)), max(0, min(255, depth)))
+    keys = np.array(sorted(best), dtype=np.uint64)
+    moves = np.array([best[int(key)][0] for key in keys], dtype=np.uint16)
+    scores = np.array([best[int(key)][1] for key in keys], dtype=np.int16)
+    depths = np.array([best[int(key)][2] for key in keys], dtype=np.uint8)
+    with open(path, 'wb') as f:
+        f.write(POSITION_CACHE_MAGIC)
+        f.write(np.array([len(keys)], dtype='<u8').tobytes())
+        for column in (keys, moves, scores, depths):
+            f.write(column.astype(column.dtype.newbyteorder('<')).tobytes())
+    return len(keys)
+
+def convert_move_cache(json_file, bin_file, depth=None):
+    # Returns (written, skipped). JSON entries without a recorded depth
+    # (written by old versions, whose moves cannot be trusted) are skipped
+    # unless depth is given for them; bin_file is left alone when nothing
+    # is written. Mate scores are clamped to the int16 range.
+    cache = load_move_cache(json_file)
+    records = []
+    skipped = 0
+    for fen, entry in cache.items():
+        entry_depth = entry.get('depth', depth)
+        if not entry_depth:
+            skipped += 1
             continue
-        visited.add(fen)
-        bot.board = board.copy()
-        score, move = bot.bitboard_negamax(depth, -100000, 100000)
-        if move:
-            cache[fen] = {'move': move.uci(), 'cp': score}
-            # Explore next positions
+        board = chess.Board(fen)
+        move = chess.Move.from_uci(entry['move']) if entry['move'] else None
+        records.append((chess.polyglot.zobrist_hash(board), move, entry['cp'] or 0, entry_depth))
+    if not records:
+        return 0, skipped
+    return write_position_cache(records, bin_file), skipped
+
+class PositionCache:
+    def __init__(self, path):
+        import numpy as np
+        with open(path, 'rb') as f:
+            header = f.read(16)
+        if header[:8] != POSITION_CACHE_MAGIC:
+            raise ValueError(f"Not a MoonBot position cache: {path}")
+        count = int(np.frombuffer(header[8:], dtype='<u8')[0])
+        self.path = path
+        self.count = count
+        if count == 0:
+            self.keys = self.moves = self.scores = self.depths = np.zeros(0)
+            return
+        offset = 16
+        self.keys = np.memmap(path, dtype='<u8', mode='r', offset=offset, shape=(count,))
+        offset += 8 * count
+        self.moves = np.memmap(path, dtype='<u2', mode='r', offset=offset, shape=(count,))
+        offset += 2 * count
+        self.scores = np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(count,))
+        offset += 2 * count
+        self.depths = np.memmap(path, dtype='u1', mode='r', offset=offset, shape=(count,))
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key):
+        # (UCI move or None, score, depth) for a Zobrist key, or None
+        index = int(self.keys.searchsorted(self.keys.dtype.type(key)))
+        if index >= self.count or int(self.keys[index]) != key:
+            return None
+        move = unpack_move(int(self.moves[index]))
+        return (move.uci() if move else None), int(self.scores[index]), int(self.depths[index])
+
+_cache_bot = None
+
+def _init_cache_worker():
+    # One bot per worker process, so its transposition table stays warm
+    global _cache_bot
+    _cache_bot = MoonBot()
+
+def _search_cache_position(fen, depth):
+    _cache_bot.board = chess.Board(fen)
+    score, move = _cache_bot.bitboard_negamax(depth, -100000, 100000)
+    return fen, (move.uci() if move else None), score
+
+def generate_move_cache(depth=9, cache_file='move_sim_cache.json', max_positions=100000,
+                        max_plies=4, workers=None, checkpoint_every=500, resume=True):
+    # Breadth-first over every legal reply up to max_plies from the start
+    # position; positions are searched in a process pool. Every
+    # checkpoint_every positions the new entries are appended to a journal
+    # (cache_file + '.journal'), so checkpoints cost the same however large
+    # the cache grows; cache_file itself is rewritten once, at the end or on
+    # interrupt. With resume=True positions already in cache_file or its
+    # journal are expanded but not searched again.
+    # Each position's replies are queued best first by one evaluate_many()
+    # call, so a run cut short by max_positions covers the likeliest lines.
+    import concurrent.futures
+    workers = workers or os.cpu_count() or 1
+    journal_file = cache_file + '.journal'
+    if resume and (os.path.exists(cache_file) or os.path.exists(journal_file)):
+        cache = load_move_cache(cache_file)
+    else:
+        cache = {}
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+    if cache:
+        print(f"Resuming from {len(cache)} cached positions.")
+    frontier = collections.deque([(chess.STARTING_FEN, 0)])
+    seen = set()
+    pending = {}
+    count = 0
+
+    def expand(fen, ply):
+        if ply >= max_plies:
+            return
+        board = chess.Board(fen)
+        children = []
+        for move in board.legal_moves:
             board.push(move)
-            q.append((board.fen(), board.copy()))
+            children.append(board.fen())
+            board.pop()
+        if not children:
+            return
+        scores = evaluate_many(children)
+        sign = 1 if board.turn == chess.WHITE else -1
+        for i in sorted(range(len(children)), key=lambda i: -sign * scores[i]):
+            frontier.append((children[i], ply + 1))
+
+    unsaved = []
+    with open(journal_file, 'a') as journal, \
+            concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_cache_worker) as pool:
+        try:
+            while frontier or pending:
+                while frontier and len(pending) < 4 * workers and count + len(pending) < max_positions:
+                    fen, ply = frontier.popleft()
+                    if fen in seen:
+                        continue
+                    seen.add(fen)
+                    if fen in cache:
+                        expand(fen, ply)
+                        continue
+                    pending[pool.submit(_search_cache_position, fen, depth)] = ply
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    ply = pending.pop(future)
+                    fen, move, score = future.result()
+                    cache[fen] = {'move': move, 'cp': score, 'depth': depth}
+                    unsaved.append(json.dumps([fen, cache[fen]]) + '\n')
+                    expand(fen, ply)
+                    count += 1
+                    if count % 100 == 0:
+                        print(f"Generated {count} positions...")
+                    if count % checkpoint_every == 0:
+                        journal.writelines(unsaved)
+                        journal.flush()
+                        unsaved.clear()
+        finally:
+            for future in pending:
+                future.cancel()
+            journal.writelines(unsaved)
+            journal.flush()
+            save_move_cache(cache, cache_file)
+    # Everything journaled is in cache_file now
+    os.remove(journal_file)
+    print(f"Move cache generated for {count} positions at depth {depth} ({len(cache)} cached in total).")
+
+# --- Endgame tablebases ---
+# Distance-to-mate tables for "king and pieces against a lone king", built
+# offline by retrograde analysis. Values are plies to mate for the strong side
+# (white after normalisation); the weak side only has king moves, and any
+# capture it can make leaves insufficient material, so it counts as a draw.
+TABLEBASE_MAGIC = b'MOONTB01'
+TABLEBASE_DIR = 'tablebases'
+TABLEBASE_SIGNATURES = ('KQK', 'KRK', 'KPK', 'KBNK')
+# Promotions in KPK are looked up in these tables
+TABLEBASE_DEPENDENCIES = {'KPK': ('KQK', 'KRK')}
+TABLEBASE_PIECES = {'Q': chess.QUEEN, 'R': chess.ROOK, 'B': chess.BISHOP, 'N': chess.KNIGHT, 'P': chess.PAWN}
+# Stored tables only keep the white king on a1-d1-d4 (pawnless) or on files
+# a-d (with pawns); every other position is reached by symmetry
+TABLEBASE_KING_SQUARES = [chess.square(f, r) for f in range(4) for r in range(f + 1)]
+TABLEBASE_PAWN_KING_SQUARES = [sq for sq in chess.SQUARES if chess.square_file(sq) < 4]
+KING_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+KNIGHT_JUMPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+_tb_lookup = None
+
+def _tb_tables():
+    # (64, 64) attack, line and between tables used by the generator
+    import numpy as np
+    global _tb_lookup
+    if _tb_lookup is None:
+        lookup = {'king': np.zeros((64, 64), bool), 'knight': np.zeros((64, 64), bool),
+                  'pawn': np.zeros((64, 64), bool), 'diag': np.zeros((64, 64), bool),
+                  'orth': np.zeros((64, 64), bool), 'between': np.zeros((64, 64), np.uint64),
+                  'bit': np.array([1 << sq for sq in chess.SQUARES], np.uint64)}
+        for a in chess.SQUARES:
+            for b in chess.SQUARES:
+                lookup['king'][a, b] = bool(chess.BB_KING_ATTACKS[a] & chess.BB_SQUARES[b])
+                lookup['knight'][a, b] = bool(chess.BB_KNIGHT_ATTACKS[a] & chess.BB_SQUARES[b])
+                lookup['pawn'][a, b] = bool(chess.BB_PAWN_ATTACKS[chess.WHITE][a] & chess.BB_SQUARES[b])
+                if a != b and chess.ray(a, b):
+                    orthogonal = chess.square_file(a) == chess.square_file(b) or chess.square_rank(a) == chess.square_rank(b)
+                    lookup['orth' if orthogonal else 'diag'][a, b] = True
+                    lookup['between'][a, b] = chess.between(a, b)
+        lookup['queen'] = lookup['diag'] | lookup['orth']
+        _tb_lookup = lookup
+    return _tb_lookup
+
+def _tb_steps(directions, step=1):
+    # Per direction, the square `step` steps away from each square, or 64 when off the board
+    import numpy as np
+    table = []
+    for df, dr in directions:
+        targets = []
+        for sq in chess.SQUARES:
+            f, r = chess.square_file(sq) + df * step, chess.square_rank(sq) + dr * step
+            targets.append(chess.square(f, r) if 0 <= f < 8 and 0 <= r < 8 else 64)
+        table.append(np.array(targets))
+    return table
+
+def _tb_along(values, axis, ndim):
+    # Reshape a per-square array so it broadcasts along one axis of the position grid
+    import numpy as np
+    shape = [1] * ndim
+    shape[axis] = 64
+    return np.asarray(values).reshape(shape)
+
+def _tb_attacks(target, wk, pieces):
+    # Whether target is attacked by the white king or pieces ((type, square) pairs)
+    lookup = _tb_tables()
+    attacked = lookup['king'][wk, target]
+    for i, (piece_type, square) in enumerate(pieces):
+        if piece_type == chess.KNIGHT:
+            attacked = attacked | lookup['knight'][square, target]
+        elif piece_type == chess.PAWN:
+            attacked = attacked | lookup['pawn'][square, target]
         else:
-            cache[fen] = {'move': None, 'cp': score}
-        count += 1
-        if count % 100 == 0:
-            print(f"Generated {count} positions...")
-    with open(cache_file, 'w') as f:
-        json.dump(cache, f)
-    print(f"Move cache generated for {count} positions at depth {depth}.")
+            blockers = lookup['bit'][wk]
+            for j, (_, other) in enumerate(pieces):
+                if j != i:
+                    blockers = blockers | lookup['bit'][other]
+            line = lookup['diag' if piece_type == chess.BISHOP else 'orth' if piece_type == chess.ROOK else 'queen']
+            attacked = attacked | (line[square, target] & ((lookup['between'][square, target] & blockers) == 0))
+    return attacked
+
+def generate_tablebase(signature, dependencies=None):
+    # Retrograde analysis over every placement of the kings and pieces.
+    # Returns full (white to move, black to move) int8 arrays indexed
+    # [wk, bk, piece1, ...] with plies to mate, or -1 for draws and illegal
+    # positions. dependencies maps signatures to their black-to-move arrays.
+    import numpy as np
+    piece_types = [TABLEBASE_PIECES[letter] for letter in signature[1:-1]]
+    ndim = 2 + len(piece_types)
+    grid = np.ogrid[(slice(0, 64),) * ndim]
+    wk, bk, squares = grid[0], grid[1], grid[2:]
+    pieces = list(zip(piece_types, squares))
+    legal = ~_tb_tables()['king'][wk, bk]
+    for i in range(ndim):
+        for j in range(i + 1, ndim):
+            legal = legal & (grid[i] != grid[j])
+    for piece_type, square in pieces:
+        if piece_type == chess.PAWN:
+            legal = legal & (square >= 8) & (square < 56)
+    legal_black = np.broadcast_to(legal, (64,) * ndim)
+    check = _tb_attacks(bk, wk, pieces)
+    legal_white = legal_black & ~check
+    king_steps = _tb_steps(KING_DIRECTIONS)
+
+    # Black: captures are draws when legal; other king moves go to white-to-move positions
+    escape = np.zeros((64,) * ndim, bool)
+    has_move = np.zeros((64,) * ndim, bool)
+    for step in king_steps:
+        target = _tb_along(step, 1, ndim)
+        for i, (_, square) in enumerate(pieces):
+            others = pieces[:i] + pieces[i + 1:]
+            escape |= (target == square) & ~_tb_attacks(square, wk, others)
+        has_move |= np.take(legal_white, np.minimum(step, 63), axis=1) & (target < 64)
+    escape &= legal_black
+    has_move |= escape
+    black = np.full((64,) * ndim, -1, np.int8)
+    black[legal_black & check & ~has_move] = 0
+    white = np.full((64,) * ndim, -1, np.int8)
+    lost_candidates = legal_black & ~escape & has_move
+
+    def white_moves_to(ply):
+        # White-to-move positions with a move into a black-to-move position lost in `ply`
+        hit = np.zeros((64,) * ndim, bool)
+        for step in king_steps:
+            hit |= (np.take(black, np.minimum(step, 63), axis=0) == ply) & _tb_along(step < 64, 0, ndim)
+        for i, (piece_type, square) in enumerate(pieces):
+            axis = 2 + i
+            others = [wk, bk] + [other for j, (_, other) in enumerate(pieces) if j != i]
+            if piece_type == chess.KNIGHT:
+                for step in _tb_steps(KNIGHT_JUMPS):
+                    hit |= (np.take(black, np.minimum(step, 63), axis=axis) == ply) & _tb_along(step < 64, axis, ndim)
+            elif piece_type == chess.PAWN:
+                hit |= _tb_pawn_moves(black, ply, axis, ndim, others, grid, dependencies or {})
+            else:
+                directions = [d for d in KING_DIRECTIONS if (piece_type != chess.BISHOP or all(d)) and (piece_type != chess.ROOK or not all(d))]
+                for direction in directions:
+                    open_path = True
+                    for distance in range(1, 8):
+                        step = _tb_steps([direction], distance)[0]
+                        valid = _tb_along(step < 64, axis, ndim)
+                        hit |= open_path & valid & (np.take(black, np.minimum(step, 63), axis=axis) == ply)
+                        target = _tb_along(step, axis, ndim)
+                        open_path = open_path & valid
+                        for other in others:
+                            open_path = open_path & (target != other)
+        return hit
+
+    dependency_max = max([int(table.max()) for table in (dependencies or {}).values()] + [0])
+    ply = 0
+    while True:
+        won = (white < 0) & legal_white & white_moves_to(ply)
+        white[won] = ply + 1
+        all_won = lost_candidates & (black < 0)
+        white_known = (white >= 0) | ~legal_white
+        for step in king_steps:
+            all_won &= np.take(white_known, np.minimum(step, 63), axis=1) | _tb_along(step >= 64, 1, ndim)
+        black[all_won] = ply + 2
+        if not won.any() and not all_won.any() and ply >= dependency_max:
+            break
+        ply += 2
+        if ply > 120:
+            raise ValueError(f"{signature}: distance to mate does not fit the table format")
+    return white, black
+
+def _tb_pawn_moves(black, ply, axis, ndim, others, grid, dependencies):
+    # Pushes, double pushes and promotions (to queen or rook, looked up in the KQK/KRK tables)
+    import numpy as np
+    squares = np.arange(64)
+    hit = np.zeros((64,) * ndim, bool)
+    push = np.where(squares < 48, squares + 8, 64)
+    hit |= (np.take(black, np.minimum(push, 63), axis=axis) == ply) & _tb_along(push < 64, axis, ndim)
+    double = np.where((squares >= 8) & (squares < 16), squares + 16, 64)
+    path_clear = True
+    for other in others:
+        path_clear = path_clear & (_tb_along(squares + 8, axis, ndim) != other)
+    hit |= path_clear & (np.take(black, np.minimum(double, 63), axis=axis) == ply) & _tb_along(double < 64, axis, ndim)
+    promotion = np.where(squares >= 48, squares + 8, 0)
+    target = _tb_along(np.minimum(promotion, 63), axis, ndim)
+    empty = _tb_along(squares >= 48, axis, ndim)
+    for other in others:
+        empty = empty & (target != other)
+    for signature in ('KQK', 'KRK'):
+        if signature in dependencies:
+            # The promoted piece replaces the pawn (KPK has no other pieces)
+            hit |= empty & (dependencies[signature][grid[0], grid[1], target] == ply)
+    return hit
+
+def write_tablebase(signature, white, black, directory=TABLEBASE_DIR):
+    # Packed uint8 (0 = draw, n = mate in n - 1 plies), white king slice only
+    import numpy as np
+    king_squares = TABLEBASE_PAWN_KING_SQUARES if 'P' in signature else TABLEBASE_KING_SQUARES
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, signature + '.mtb')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(TABLEBASE_MAGIC)
+        for table in (white, black):
+            f.write((table[king_squares].astype(np.int16) + 1).astype(np.uint8).tobytes())
+    os.replace(path + '.tmp', path)
+    return path
+
+def build_tablebases(signatures=TABLEBASE_SIGNATURES, directory=TABLEBASE_DIR):
+    # Generates the requested tables (and what they depend on) into directory
+    built = {}
+    pending = []
+    for signature in signatures:
+        pending.extend(d for d in TABLEBASE_DEPENDENCIES.get(signature, ()) if d not in pending)
+        if signature not in pending:
+            pending.append(signature)
+    for signature in pending:
+        start = time.perf_counter()
+        dependencies = {d: built[d][1] for d in TABLEBASE_DEPENDENCIES.get(signature, ())}
+        built[signature] = generate_tablebase(signature, dependencies)
+        path = write_tablebase(signature, *built[signature], directory)
+        white = built[signature][0]
+        print(f"{signature}: longest mate {int(white.max())} plies, {int((white > 0).sum())} won positions "
+              f"with white to move, {time.perf_counter() - start:.1f}s -> {path}")
+    return list(built)
+
+class Tablebases:
+    # Memory-mapped tables from build_tablebases, probed by MoonBot's search
+    def __init__(self, directory=TABLEBASE_DIR):
+        import numpy as np
+        self.directory = directory
+        self.tables = {}
+        for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            if not name.endswith('.mtb'):
+                continue
+            signature = name[:-4]
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                if f.read(8) != TABLEBASE_MAGIC:
+                    raise ValueError(f"Not a MoonBot tablebase: {path}")
+            kings = len(TABLEBASE_PAWN_KING_SQUARES if 'P' in signature else TABLEBASE_KING_SQUARES)
+            size = kings * 64 ** (len(signature) - 1)
+            data = np.memmap(path, dtype=np.uint8, mode='r', offset=8, shape=(2, size))
+            self.tables[signature] = data
+        self.max_pieces = max((len(signature) for signature in self.tables), default=0)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def probe(self, board):
+        # (outcome, plies to mate) for the side to move: outcome is 1 (win),
+        # 0 (draw) or -1 (loss); None when no table covers the position
+        if chess.popcount(board.occupied) > self.max_pieces:
+            return None
+        strong = None
+        for color in chess.COLORS:
+            if board.occupied_co[color] & ~board.kings:
+                if strong is not None:
+                    return None
+                strong = color
+        if strong is None:
+            return 0, 0
+        pieces = sorted(((piece_type, sq) for piece_type in chess.PIECE_TYPES[:-1]
+                         for sq in board.pieces(piece_type, strong)), key=lambda item: -item[0])
+        signature = 'K' + ''.join(chess.piece_symbol(piece_type).upper() for piece_type, _ in pieces) + 'K'
+        table = self.tables.get(signature)
+        if table is None:
+            return None
+        squares = [board.king(strong), board.king(not strong)] + [sq for _, sq in pieces]
+        if strong == chess.BLACK:
+            squares = [chess.square_mirror(sq) for sq in squares]
+        if 'P' in signature:
+            king_squares = TABLEBASE_PAWN_KING_SQUARES
+            if chess.square_file(squares[0]) > 3:
+                squares = [sq ^ 7 for sq in squares]
+        else:
+            king_squares = TABLEBASE_KING_SQUARES
+            if chess.square_file(squares[0]) > 3:
+                squares = [sq ^ 7 for sq in squares]
+            if chess.square_rank(squares[0]) > 3:
+                squares = [sq ^ 56 for sq in squares]
+            if chess.square_rank(squares[0]) > chess.square_file(squares[0]):
+                squares = [(sq >> 3) | ((sq & 7) << 3) for sq in squares]
+        index = king_squares.index(squares[0])
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        value = int(table[0 if board.turn == strong else 1][index])
+        if not value:
+            return 0, 0
+        return (1 if board.turn == strong else -1), value - 1
+
+    def score(self, board, ply):
+        # probe() as a search score: mate scores counted from the root, like the search's own
+        result = self.probe(board)
+        if result is None:
+            return None
+        outcome, plies = result
+        return outcome * (MATE_SCORE - (ply + plies)) if outcome else 0
+
+    def best_move(self, board):
+        # Fastest win, else a draw, else the slowest loss; None when a reply is not covered
+        best, best_rank = None, None
+        for move in board.legal_moves:
+            board.push(move)
+            result = self.probe(board)
+            if result is None and board.is_insufficient_material():
+                result = (0, 0)
+            board.pop()
+            if result is None:
+                return None
+            # The reply is probed from the opponent's side
+            outcome, plies = result
+            rank = (2, -plies) if outcome < 0 else (1, 0) if outcome == 0 else (0, plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+# --- Batch analysis ---
+_analysis_bot = None
+
+def _init_analysis_worker():
+    # One bot per worker process; its transposition table stays warm across positions
+    global _analysis_bot
+    _analysis_bot = MoonBot()
+
+def _analyse_position(index, position_id, fen, depth, movetime_ms, max_depth=None):
+    bot = _analysis_bot
+    bot.from_fen(fen)
+    result = {'index': index, 'id': position_id, 'fen': fen, 'move': None, 'score': None, 'depth': 0, 'pv': [], 'nodes': 0}
+
+    def report(completed, score, pv, nodes):
+        result.update(depth=completed, score=score, pv=pv, nodes=nodes)
+
+    start = time.perf_counter()
+    result['move'] = bot.get_best_move(depth or 3, movetime_ms=movetime_ms, max_depth=max_depth, on_iteration=report)
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+def read_positions(path):
+    # Yields (id, FEN) from a file of FENs or EPDs, one per line; EPD "id" opcodes are kept
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            board = chess.Board()
+            fields = line.split()
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                board.set_fen(' '.join(fields[:6]))
+                operations = {}
+            else:
+                operations = board.set_epd(line)
+            yield operations.get('id', str(number)), board.fen()
+
+def analyse_many(positions, depth=None, movetime_ms=None, workers=None):
+    # Analyses FENs (or (id, FEN) pairs) in a process pool and yields one dict
+    # per position in completion order: index, id, fen, move, score (side to
+    # move, cp), depth, pv, nodes, seconds. Only a few positions per worker
+    # are in flight, so any iterable (e.g. read_positions) is streamed.
+    import concurrent.futures
+    workers = workers or os.cpu_count() or 1
+    positions = iter(enumerate(positions))
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_analysis_worker) as pool:
+        pending = set()
+        while True:
+            for index, position in positions:
+                position_id, fen = position if isinstance(position, tuple) else (str(index), position)
+                pending.add(pool.submit(_analyse_position, index, position_id, fen, depth, movetime_ms))
+                if len(pending) >= 4 * workers:
+                    break
+            if not pending:
+                return
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def static_scores(positions, batch_size=EVAL_BATCH_SIZE):
+    # Material + PST only, no search: yields index, id, fen and score (side to
+    # move, cp) per position, in order, scoring batch_size positions per evaluate_many()
+    positions = enumerate(positions)
+    while True:
+        batch = []
+        for index, position in positions:
+            position_id, fen = position if isinstance(position, tuple) else (str(index), position)
+            batch.append((index, position_id, fen))
+            if len(batch) >= batch_size:
+                break
+        if not batch:
+            return
+        scores = evaluate_many([fen for _, _, fen in batch])
+        for (index, position_id, fen), score in zip(batch, scores.tolist()):
+            yield {'index': index, 'id': position_id, 'fen': fen, 'score': -score if fen.split()[1] == 'b' else score}
+
+# --- Analysis server ---
+ANALYSIS_PORT = 8765
+# Results kept for repeated positions; the least recently used are evicted first
+SERVER_CACHE_SIZE = 10000
+
+class AnalysisServer:
+    # JSON lines over TCP on localhost, one request per line:
+    #   {"id": 1, "cmd": "analyse", "fen": "...", "movetime": 200, "depth": 8, "priority": 0}
+    # cmd is "analyse" (move, score, depth, pv, nodes), "bestmove" (move only) or
+    # "stats". Every search gets a time budget (movetime, capped at
+    # max_movetime_ms); depth optionally stops it earlier. Lower priorities are
+    # searched first. Responses carry the request's id and may arrive out of order.
+    def __init__(self, workers=None, cache_size=SERVER_CACHE_SIZE, default_movetime_ms=1000, max_movetime_ms=10000):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.default_movetime_ms = default_movetime_ms
+        self.max_movetime_ms = max_movetime_ms
+        # (fen, depth, movetime) -> result, in least recently used order
+        self.cache = collections.OrderedDict()
+        # (fen, depth, movetime) -> asyncio future shared by duplicate requests
+        self.in_flight = {}
+        self.counters = collections.Counter()
+        self.sequence = 0
+        self.pool = None
+        self.queue = None
+        self.dispatchers = []
+
+    async def serve(self, host='127.0.0.1', port=ANALYSIS_PORT):
+        import asyncio
+        await self.start()
+        server = await asyncio.start_server(self._handle_client, host, port)
+        print(f"[MoonBot] Analysis server on {host}:{port} with {self.workers} workers.", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def start(self):
+        # Starts the worker processes and searches one position in each, so the
+        # first requests do not pay for process start-up and imports
+        import asyncio
+        import concurrent.futures
+        loop = asyncio.get_running_loop()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_analysis_worker)
+        self.queue = asyncio.PriorityQueue()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _analyse_position, -1, None, chess.STARTING_FEN, 1, None)
+                               for _ in range(self.workers)))
+        self.dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+
+    def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _dispatch(self):
+        # One dispatcher per worker, so the queue (not the pool) decides what runs next
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, key, future = await self.queue.get()
+            fen, depth, movetime_ms = key
+            try:
+                result = await loop.run_in_executor(self.pool, _analyse_position, 0, None, fen, None, movetime_ms, depth)
+            except Exception as error:
+                del self.in_flight[key]
+                future.set_exception(error)
+                continue
+            del self.in_flight[key]
+            del result['index'], result['id']
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.counters['evictions'] += 1
+            future.set_result(result)
+
+    async def request(self, request):
+        # Answers one decoded request; raises ValueError for bad ones
+        import asyncio
+        command = request.get('cmd', 'analyse')
+        if command == 'stats':
+            return self.stats()
+        if command not in ('analyse', 'bestmove'):
+            raise ValueError(f"Unknown command: {command}")
+        if 'fen' not in request:
+            raise ValueError("Missing fen.")
+        fen = chess.Board(request['fen']).fen()
+        depth = request.get('depth')
+        depth = None if depth is None else max(1, min(int(depth), MAX_SEARCH_DEPTH))
+        movetime_ms = min(int(request.get('movetime') or self.default_movetime_ms), self.max_movetime_ms)
+        priority = int(request.get('priority', 0))
+        key = (fen, depth, movetime_ms)
+        self.counters['requests'] += 1
+        result = self.cache.get(key)
+        cached = result is not None
+        if cached:
+            self.cache.move_to_end(key)
+            self.counters['cache_hits'] += 1
+        else:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = self.in_flight[key] = asyncio.get_running_loop().create_future()
+                self.sequence += 1
+                self.queue.put_nowait((priority, self.sequence, key, future))
+                self.counters['searches'] += 1
+            else:
+                self.counters['coalesced'] += 1
+            # A client that goes away must not cancel a search others are waiting on
+            result = await asyncio.shield(future)
+        if command == 'bestmove':
+            return {'fen': fen, 'move': result['move'], 'cached': cached}
+        return dict(result, cached=cached)
+
+    def stats(self):
+        return dict(self.counters, workers=self.workers, queued=self.queue.qsize(),
+                    in_flight=len(self.in_flight), cached=len(self.cache))
+
+    async def _handle_client(self, reader, writer):
+        import asyncio
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self._respond(line, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects.")
+            request_id = request.get('id')
+            response = await self.request(request)
+        except (ValueError, TypeError) as error:
+            response = {'error': str(error)}
+        except Exception as error:
+            response = {'error': f"Search failed: {error!r}"}
+        response['id'] = request_id
+        writer.write((json.dumps(response) + '\n').encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+def serve_analysis(port=ANALYSIS_PORT, workers=None, cache_size=SERVER_CACHE_SIZE, default_movetime_ms=None):
+    import asyncio
+    server = AnalysisServer(workers, cache_size, default_movetime_ms or 1000)
+    try:
+        asyncio.run(server.serve('127.0.0.1', port))
+    except KeyboardInterrupt:
+        pass
+
+# --- Bot-vs-bot matches ---
+# Balanced openings; every one is played twice with colours reversed
+MATCH_OPENINGS = [
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+    'r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+    'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3',
+    'rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2',
+    'rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',
+    'rnbqkb1r/pppp1ppp/4pn2/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3',
+    'rnbqkbnr/pp1ppppp/8/2p5/2P5/8/PP1PPPPP/RNBQKBNR w KQkq - 0 2',
+    'rnbqkbnr/ppp1pppp/8/3p4/8/5N2/PPPPPPPP/RNBQKB1R w KQkq - 0 2',
+    'rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3',
+    'rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 0 3',
+    'rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2',
+    'rnbqkb1r/pppppppp/5n2/8/3P4/5N2/PPP1PPPP/RNBQKB1R b KQkq - 2 2',
+    'rnbqkbnr/pppppp1p/6p1/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2',
+]
+# Games still running after this many plies are adjudicated as draws
+MATCH_MAX_PLIES = 300
 
-def play_cli(depth=3, play_as='white', bot_vs_bot=False):
-    bot = MoonBot()
+def parse_match_config(spec):
+    # "depth=3,movetime=200,mobility=legal,engine=python" -> dict
+    config = {'name': spec or 'default', 'depth': 3, 'movetime': None, 'mobility': 'attacks', 'engine': 'auto'}
+    for item in filter(None, (spec or '').split(',')):
+        key, _, value = item.partition('=')
+        if key not in config or key == 'name':
+            raise ValueError(f"Unknown match option: {key}")
+        config[key] = int(value) if key in ('depth', 'movetime') else value
+    return config
+
+def _match_bot(config):
+    bot = MoonBot(mobility=config['mobility'])
+    # The compiled engine only implements the default evaluation
+    if config['engine'] == 'python' or config['mobility'] != 'attacks':
+        bot.engine = None
+    return bot
+
+def _play_match_game(fen, white, black, max_plies=MATCH_MAX_PLIES):
+    # Returns (PGN text, result, termination, {config name: [nodes, seconds]})
+    import chess.pgn
+    bots = {chess.WHITE: (_match_bot(white), white), chess.BLACK: (_match_bot(black), black)}
+    for bot, _ in bots.values():
+        bot.from_fen(fen)
+    board = chess.Board(fen)
+    usage = {white['name']: [0, 0.0], black['name']: [0, 0.0]}
+    while not board.is_game_over(claim_draw=True) and board.ply() - chess.Board(fen).ply() < max_plies:
+        bot, config = bots[board.turn]
+        start = time.perf_counter()
+        move = bot.get_best_move(config['depth'], movetime_ms=config['movetime'])
+        usage[config['name']][1] += time.perf_counter() - start
+        usage[config['name']][0] += bot.engine.nodes if bot.engine is not None else bot.nodes
+        if move is None:
+            break
+        board.push_uci(move)
+        for other, _ in bots.values():
+            other.make_move(move)
+    outcome = board.outcome(claim_draw=True)
+    if outcome is not None:
+        result, termination = outcome.result(), outcome.termination.name.lower()
+    else:
+        # Out of plies (adjudicated) or the bot found no move
+        result, termination = '1/2-1/2', 'adjudicated'
+    game = chess.pgn.Game.from_board(board)
+    game.headers['Termination'] = termination
+    game.headers['Event'] = 'MoonBot match'
+    game.headers['White'] = white['name']
+    game.headers['Black'] = black['name']
+    game.headers['Result'] = result
+    return str(game), result, termination, usage
+
+def match_elo(wins, draws, losses):
+    # Elo difference and 95% error bar from the per-game score variance
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def elo(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / p - 1)
+
+    return elo(score), (elo(score + margin) - elo(score - margin)) / 2
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    # Log-likelihood ratio of H1 (elo1) against H0 (elo0), normal approximation
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if not variance:
+        return 0.0
+    s0 = 1 / (1 + 10 ** (-elo0 / 400))
+    s1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+def run_match(config_a, config_b, games=100, pgn_file='match.pgn', workers=None,
+              elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05, openings=MATCH_OPENINGS):
+    # Plays games between two configurations in a process pool. Results are
+    # from A's point of view; the SPRT stops the match once H0 or H1 is accepted.
+    # Games are appended to pgn_file; progress goes to stderr.
+    import concurrent.futures
+    a, b = parse_match_config(config_a), parse_match_config(config_b)
+    if a['name'] == b['name']:
+        a['name'], b['name'] = a['name'] + ' (A)', b['name'] + ' (B)'
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    wins = draws = losses = 0
+    # How games ended, e.g. checkmate / threefold_repetition / adjudicated
+    terminations = collections.Counter()
+    usage = {a['name']: [0, 0.0], b['name']: [0, 0.0]}
+    verdict = None
+    start = time.perf_counter()
+    with open(pgn_file, 'a') as pgn, concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {}
+        for i in range(games):
+            fen = openings[i // 2 % len(openings)]
+            white, black = (a, b) if i % 2 == 0 else (b, a)
+            futures[pool.submit(_play_match_game, fen, white, black)] = white is a
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            game_pgn, result, termination, game_usage = future.result()
+            terminations[termination] += 1
+            pgn.write(game_pgn + '\n\n')
+            pgn.flush()
+            if result == '1/2-1/2':
+                draws += 1
+            elif (result == '1-0') == futures[future]:
+                wins += 1
+            else:
+                losses += 1
+            for name, (nodes, seconds) in game_usage.items():
+                usage[name][0] += nodes
+                usage[name][1] += seconds
+            elo, margin = match_elo(wins, draws, losses)
+            llr = sprt_llr(wins, draws, losses, elo0, elo1)
+            print(f"Game {done}/{games}: +{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {margin:.1f}  "
+                  f"LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]", file=sys.stderr)
+            if llr >= upper or llr <= lower:
+                verdict = 'H1' if llr >= upper else 'H0'
+                for pending in futures:
+                    pending.cancel()
+                break
+    elo, margin = match_elo(wins, draws, losses)
+    results = {
+        'games': wins + draws + losses,
+        'wins': wins, 'draws': draws, 'losses': losses, 'terminations': dict(terminations),
+        'elo': round(elo, 1), 'elo_error': round(margin, 1),
+        'sprt': {'elo0': elo0, 'elo1': elo1, 'llr': round(sprt_llr(wins, draws, losses, elo0, elo1), 3),
+                 'lower': round(lower, 3), 'upper': round(upper, 3), 'verdict': verdict},
+        'nps': {name: int(nodes / seconds) if seconds else 0 for name, (nodes, seconds) in usage.items()},
+        'seconds': round(time.perf_counter() - start, 1),
+    }
+    print(f"{a['name']} vs {b['name']}: +{wins} ={draws} -{losses}, Elo {elo:+.1f} +/- {margin:.1f}, "
+          f"SPRT {verdict or 'inconclusive'}", file=sys.stderr)
+    print("  Terminations: " + ', '.join(f"{name} {count}" for name, count in terminations.most_common()), file=sys.stderr)
+    for name, nps in results['nps'].items():
+        print(f"  {name}: {nps} nps", file=sys.stderr)
+    return results
+
+# --- Lazy SMP ---
+# Helper processes search the same root through one shared transposition
+# table. Each helper has its own depth schedule and root move order so the
+# helpers fill the table for each other instead of repeating the same work.
+# Depth skipping follows Stockfish's original Lazy SMP tables: helper n > 0
+# skips depth d when ((d + phase) // size) is odd.
+SMP_SKIP_SIZE = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+SMP_SKIP_PHASE = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+_smp_bot = None
+_smp_progress = None
+
+def _init_smp_worker(tt_name, tt_size, progress, stop_event):
+    global _smp_bot, _smp_progress
+    _smp_bot = MoonBot()
+    _smp_bot.stop_event = stop_event
+    _smp_bot.tt = SharedTranspositionTable(tt_size, name=tt_name)
+    if _smp_bot.engine is not None:
+        _smp_bot.engine.attach_tt(_smp_bot.tt.words)
+    _smp_progress = progress
+
+def smp_depths(helper, max_depth):
+    # Depth 1 (the clock only applies after it) and max_depth (so a fixed-depth
+    # search is not ended early by a helper) are always searched
+    if helper == 0:
+        return list(range(1, max_depth + 1))
+    size, phase = SMP_SKIP_SIZE[(helper - 1) % 20], SMP_SKIP_PHASE[(helper - 1) % 20]
+    depths = [1] + [depth for depth in range(2, max_depth) if (depth + phase) // size % 2 == 0]
+    return depths + [max_depth] if max_depth > 1 else depths
+
+def _smp_ready():
+    return _smp_bot is not None
+
+def _smp_search(helper, generation, root_fen, moves, max_depth, movetime_ms):
+    # Returns (completed depth, score, UCI move) of this helper's deepest iteration
+    bot = _smp_bot
+    bot.tt.generation = generation
+    if bot.engine is not None:
+        bot.engine.generation = generation
+    bot.from_fen(root_fen)
+    for move in moves:
+        bot.make_move(move)
+    completed = [0]
+
+    def report(depth, score, pv, nodes):
+        completed[0] = depth
+        _smp_progress.put((generation, helper, depth, score, pv, nodes))
+
+    depths = smp_depths(helper, max_depth)
+    if bot.engine is not None:
+        bot._sync_engine()
+        bot.engine.stop_event = bot.stop_event
+        bot.engine.root_rotation = helper
+        score, move, depth = bot.engine.iterative_deepening(max_depth, movetime_ms or 0, report, depths)
+        return depth, score, move
+    bot.root_rotation = helper
+    score, move = bot.iterative_deepening(max_depth, movetime_ms, report, depths)
+    return completed[0], score, (move.uci() if move else None)
+
+class LazySMP:
+    def __init__(self, threads=None, tt_size=1 << 20):
+        import concurrent.futures
+        import multiprocessing
+        self.threads = threads or os.cpu_count() or 1
+        self.tt = SharedTranspositionTable(tt_size)
+        context = multiprocessing.get_context('spawn')
+        self.progress = context.Queue()
+        self.stop_event = context.Event()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.threads, mp_context=context, initializer=_init_smp_worker,
+                                                           initargs=(self.tt.name, tt_size, self.progress, self.stop_event))
+        self.generation = 0
+        # Processes are spawned on submit; start them all now so the first
+        # search does not pay for process start-up against its clock
+        concurrent.futures.wait([self.pool.submit(_smp_ready) for _ in range(self.threads)])
+
+    def search(self, board, max_depth=MAX_SEARCH_DEPTH, movetime_ms=None, on_iteration=None, stop_event=None):
+        # Returns (score, UCI move, depth) from the deepest completed iteration
+        # of any helper. The search ends when the first helper finishes or when
+        # stop_event (e.g. a UCI stop) is set. on_iteration(depth, score, pv, nodes)
+        # fires whenever a new depth is completed; nodes are summed over helpers.
+        import concurrent.futures
+        self.generation += 1
+        self.stop_event.clear()
+        moves = [move.uci() for move in board.move_stack]
+        futures = [self.pool.submit(_smp_search, helper, self.generation, board.root().fen(), moves, max_depth, movetime_ms)
+                   for helper in range(self.threads)]
+        nodes = [0] * self.threads
+        reported = 0
+        while True:
+            done, _ = concurrent.futures.wait(futures, timeout=0.01, return_when=concurrent.futures.FIRST_COMPLETED)
+            while True:
+                try:
+                    generation, helper, depth, score, pv, helper_nodes = self.progress.get_nowait()
+                except queue.Empty:
+                    break
+                if generation != self.generation:
+                    continue
+                nodes[helper] = helper_nodes
+                if depth > reported:
+                    reported = depth
+                    if on_iteration is not None:
+                        on_iteration(depth, score, pv, sum(nodes))
+            if done or (stop_event is not None and stop_event.is_set()):
+                break
+        self.stop_event.set()
+        results = [future.result() for future in futures]
+        depth, score, move = max(results, key=lambda result: (result[0], result[2] is not None))
+        return score, move, depth
+
+    def close(self):
+        self.stop_event.set()
+        self.pool.shutdown()
+        self.tt.close()
+
+# --- Background search and pondering ---
+# Front ends run the engine in a one-process pool so they stay responsive and
+# can search on the opponent's time. The worker keeps one MoonBot (and its
+# transposition table) for the whole game.
+_search_bot = None
+_search_progress = None
+_search_id = 0
+_search_pv = []
+
+def _init_search_worker(progress, stop_event, position_cache=None, tablebases=None):
+    global _search_bot, _search_progress
+    _search_bot = MoonBot(position_cache=position_cache, tablebases=tablebases)
+    _search_bot.stop_event = stop_event
+    _search_progress = progress
+
+def _report_iteration(depth, score, pv, nodes):
+    global _search_pv
+    _search_pv = pv
+    _search_progress.put((_search_id, (depth, score, pv, nodes)))
+
+def _search_worker(search_id, root_fen, moves, movetime_ms, max_depth):
+    # Replays the game so repetition detection sees the full history.
+    # Returns (best move, predicted reply to ponder on)
+    global _search_id, _search_pv
+    _search_id = search_id
+    _search_pv = []
+    _search_bot.from_fen(root_fen)
+    for move in moves:
+        _search_bot.make_move(move)
+    move = _search_bot.get_best_move(movetime_ms=movetime_ms, max_depth=max_depth, on_iteration=_report_iteration)
+    reply = _search_pv[1] if len(_search_pv) > 1 and _search_pv[0] == move else None
+    return move, reply
+
+class SearchWorker:
+    def __init__(self, position_cache=None, tablebases=None):
+        import concurrent.futures
+        import multiprocessing
+        # spawn: the worker must not inherit the parent's SDL/display state
+        context = multiprocessing.get_context('spawn')
+        if isinstance(position_cache, PositionCache):
+            position_cache = position_cache.path
+        if isinstance(tablebases, Tablebases):
+            tablebases = tablebases.directory
+        self.progress = context.Queue()
+        self.stop_event = context.Event()
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_search_worker,
+                                                           initargs=(self.progress, self.stop_event, position_cache, tablebases))
+        self.future = None
+        self.search_id = 0
+        self.info = None
+        # Move the running search assumes the opponent will play, while pondering
+        self.pondering = None
+        # Predicted reply from the PV of the last finished search
+        self.ponder_move = None
+        self.stop_at = None
+
+    def start(self, board, movetime_ms, max_depth, ponder_move=None):
+        self.cancel()
+        self.stop_event.clear()
+        self.search_id += 1
+        self.info = None
+        self.pondering = ponder_move
+        moves = [move.uci() for move in board.move_stack] + ([ponder_move] if ponder_move else [])
+        self.future = self.pool.submit(_search_worker, self.search_id, board.root().fen(), moves, movetime_ms, max_depth)
+
+    def ponder(self, board, max_depth=MAX_SEARCH_DEPTH):
+        # Speculatively search the predicted reply with no time limit until
+        # ponder_hit or cancel; the worker's TT keeps what it finds either way
+        move = self.ponder_move
+        if move is None or board.is_game_over() or chess.Move.from_uci(move) not in board.legal_moves:
+            return False
+        self.start(board, None, max_depth, ponder_move=move)
+        return True
+
+    def ponder_hit(self, move_uci, movetime_ms=None):
+        # The opponent played the predicted move: keep the running search and
+        # give it movetime_ms from now. Any other move discards it.
+        if self.pondering is None:
+            return False
+        if move_uci != self.pondering:
+            self.cancel()
+            return False
+        self.pondering = None
+        if movetime_ms is not None:
+            self.stop_at = time.monotonic() + movetime_ms / 1000
+        return True
+
+    def busy(self):
+        return self.future is not None
+
+    def poll(self):
+        # Updates self.info with the latest (depth, score, pv, nodes) and returns
+        # the best move once a (non-ponder) search is done, else None
+        if self.stop_at is not None and time.monotonic() >= self.stop_at:
+            self.stop_event.set()
+        while True:
+            try:
+                search_id, info = self.progress.get_nowait()
+            except queue.Empty:
+                break
+            if search_id == self.search_id:
+                self.info = info
+        if self.future is None or self.pondering is not None or not self.future.done():
+            return None
+        move, self.ponder_move = self.future.result()
+        self.future = None
+        self.stop_at = None
+        return move
+
+    def wait(self):
+        while True:
+            move = self.poll()
+            if self.future is None:
+                return move
+            time.sleep(0.01)
+
+    def cancel(self):
+        import concurrent.futures
+        if self.future is not None:
+            self.stop_event.set()
+            try:
+                self.future.result()
+            except concurrent.futures.CancelledError:
+                pass
+        self.future = None
+        self.pondering = None
+        self.stop_at = None
+
+    def close(self):
+        # Aborts a running search instead of waiting for its deadline
+        self.stop_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# --- UCI front end ---
+UCI_NAME = 'MoonBot'
+UCI_AUTHOR = 'snave'
+# Clock kept in reserve so a move never flags on GUI/OS latency
+UCI_TIME_MARGIN_MS = 50
+UCI_DEFAULT_MOVES_TO_GO = 30
+
+def allocate_time(time_left_ms, increment_ms=0, moves_to_go=None):
+    # An even share of the remaining clock plus most of the increment
+    budget = time_left_ms / (moves_to_go or UCI_DEFAULT_MOVES_TO_GO) + increment_ms * 3 / 4
+    return max(10, min(budget, time_left_ms - UCI_TIME_MARGIN_MS))
+
+def uci_score(score):
+    if abs(score) >= MATE_BOUND:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+class UciEngine:
+    # Commands are read on the calling thread; the search runs on its own
+    # thread and polls stop_event, so stop and ponderhit act immediately
+    def __init__(self, output=sys.stdout, threads=1, profile=None, profile_pstats=False):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.threads = threads
+        # Lazy SMP helpers, started on the first search with threads > 1
+        self.smp = None
+        # Profiling covers single-threaded searches; Lazy SMP runs in other processes
+        self.bot = MoonBot(profile=profile, profile_pstats=profile_pstats)
+        self.bot.stop_event = threading.Event()
+        self.root_fen = chess.STARTING_FEN
+        self.moves = []
+        self.thread = None
+        # Set when bestmove may be sent; cleared for go infinite / go ponder
+        self.release = threading.Event()
+        self.timer = None
+        self.ponder_time_ms = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line.strip()):
+                break
+        self.stop()
+        if self.smp is not None:
+            self.smp.close()
+
+    def handle(self, line):
+        # Returns False on quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f"id name {UCI_NAME}")
+            self.send(f"id author {UCI_AUTHOR}")
+            self.send("option name Ponder type check default false")
+            self.send(f"option name Threads type spin default {self.threads} min 1 max {os.cpu_count() or 1}")
+            self.send("uciok")
+        elif command == 'isready':
+            # GUIs wait for readyok before starting the clock, so helpers start here
+            self.start_helpers()
+            self.send("readyok")
+        elif command == 'ucinewgame':
+            self.stop()
+            self.bot.new_game()
+            self.root_fen = chess.STARTING_FEN
+            self.moves = []
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'quit':
+            return False
+        return True
+
+    def hashfull(self):
+        return self.smp.tt.hashfull() if self.threads > 1 and self.smp is not None else self.bot.hashfull()
+
+    def set_option(self, args):
+        # setoption name <id> [value <x>]
+        if 'name' not in args:
+            return
+        end = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:end]).lower()
+        value = ' '.join(args[end + 1:])
+        if name == 'threads' and value.isdigit():
+            self.stop()
+            if self.smp is not None and self.smp.threads != int(value):
+                self.smp.close()
+                self.smp = None
+            self.threads = max(1, int(value))
+            self.start_helpers()
+
+    def start_helpers(self):
+        if self.threads > 1 and self.smp is None:
+            self.smp = LazySMP(self.threads)
+
+    def set_position(self, args):
+        if args and args[0] == 'startpos':
+            fen, rest = chess.STARTING_FEN, args[1:]
+        elif args and args[0] == 'fen':
+            end = args.index('moves') if 'moves' in args else len(args)
+            fen, rest = ' '.join(args[1:end]), args[end:]
+        else:
+            return
+        moves = rest[1:] if rest and rest[0] == 'moves' else []
+        # GUIs resend the whole game every move: only play what is new
+        if fen != self.root_fen or moves[:len(self.moves)] != self.moves:
+            self.bot.from_fen(fen)
+            self.root_fen = fen
+            self.moves = []
+        for move in moves[len(self.moves):]:
+            # Checked here: make_move() reports bad moves on stdout, the protocol channel
+            try:
+                legal = chess.Move.from_uci(move) in self.bot.board.legal_moves
+            except ValueError:
+                legal = False
+            if not legal:
+                print(f"[MoonBot] Ignoring illegal move {move} and the rest of the position.", file=sys.stderr)
+                break
+            self.bot.make_move(move)
+            self.moves.append(move)
+
+    def go(self, args):
+        params = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif i + 1 < len(args) and args[i + 1].lstrip('-').isdigit():
+                params[args[i]] = int(args[i + 1])
+                i += 2
+            else:
+                i += 1
+        movetime_ms = params.get('movetime')
+        if movetime_ms is None:
+            side = 'w' if self.bot.board.turn == chess.WHITE else 'b'
+            if side + 'time' in params:
+                movetime_ms = allocate_time(params[side + 'time'], params.get(side + 'inc', 0), params.get('movestogo'))
+        # The search's per-ply tables only have MAX_SEARCH_DEPTH + 1 slots
+        max_depth = min(params.get('depth', MAX_SEARCH_DEPTH), MAX_SEARCH_DEPTH)
+        if max_depth < 1:
+            print(f"[MoonBot] Ignoring go depth {max_depth}: depth must be positive.", file=sys.stderr)
+            max_depth = MAX_SEARCH_DEPTH
+        self.ponder_time_ms = None
+        self.bot.stop_event.clear()
+        self.release.clear()
+        if 'infinite' in flags or 'ponder' in flags:
+            # No clock until stop, or until ponderhit starts the clock
+            if 'ponder' in flags:
+                self.ponder_time_ms = movetime_ms
+            movetime_ms = None
+        else:
+            self.release.set()
+        self.thread = threading.Thread(target=self._search, args=(movetime_ms, max_depth), daemon=True)
+        self.thread.start()
+
+    def ponderhit(self):
+        # The predicted move was played: the running search becomes a normal timed one
+        if self.ponder_time_ms is not None:
+            self.timer = threading.Timer(self.ponder_time_ms / 1000, self.bot.stop_event.set)
+            self.timer.daemon = True
+            self.timer.start()
+        self.ponder_time_ms = None
+        self.release.set()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.bot.stop_event.set()
+        self.release.set()
+        self.thread.join()
+        self.thread = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _search(self, movetime_ms, max_depth):
+        start = time.monotonic()
+        pv = []
+
+        def report(depth, score, line, nodes):
+            pv[:] = line
+            elapsed = max(time.monotonic() - start, 1e-6)
+            self.send(f"info depth {depth} score {uci_score(score)} nodes {nodes} nps {int(nodes / elapsed)} "
+                      f"time {int(elapsed * 1000)} hashfull {self.hashfull()} pv {' '.join(line)}")
+
+        if self.threads > 1:
+            self.start_helpers()
+            _, move, _ = self.smp.search(self.bot.board, max_depth, movetime_ms, report, self.bot.stop_event)
+        else:
+            move = self.bot.get_best_move(movetime_ms=movetime_ms, max_depth=max_depth, on_iteration=report)
+        if move is None:
+            legal = list(self.bot.board.legal_moves)
+            move = legal[0].uci() if legal else None
+        # bestmove must wait for stop/ponderhit after go infinite or go ponder
+        self.release.wait()
+        if move is None:
+            self.send("bestmove 0000")
+        elif len(pv) > 1 and pv[0] == move:
+            self.send(f"bestmove {move} ponder {pv[1]}")
+        else:
+            self.send(f"bestmove {move}")
+
+def play_cli(depth=3, play_as='white', bot_vs_bot=False, movetime_ms=None, position_cache=None, ponder=False,
+             tablebases=None, profile=None, profile_pstats=False):
+    bot = MoonBot(position_cache=position_cache, tablebases=tablebases, profile=profile, profile_pstats=profile_pstats)
+    # With ponder, the engine searches in a worker and keeps thinking while the user types
+    searcher = SearchWorker(position_cache, tablebases) if ponder and not bot_vs_bot else None
+    max_depth = depth if movetime_ms is None else MAX_SEARCH_DEPTH
     print("Welcome to MoonBot Chess! Enter your moves in UCI format (e.g., e2e4). Type 'quit' to exit.")
     print(f"Playing as: {play_as.capitalize()} | Depth: {depth} | Bot vs Bot: {bot_vs_bot}")
     bot.print_board()
@@ -239,7 +2584,12 @@ def play_cli(depth=3, play_as='white', bot_vs_bot=False):
     while not bot.board.is_game_over():
         if bot_vs_bot or (bot.board.turn == chess.WHITE and not user_is_white) or (bot.board.turn == chess.BLACK and user_is_white):
             # Bot's move
-            bot_move = bot.get_best_move(depth)
+            if searcher is None:
+                bot_move = bot.get_best_move(depth, movetime_ms=movetime_ms)
+            else:
+                if not searcher.busy():
+                    searcher.start(bot.board, movetime_ms, max_depth)
+                bot_move = searcher.wait()
             if bot_move:
                 print(f"MoonBot ({'White' if bot.board.turn == chess.WHITE else 'Black'}) plays: {bot_move}")
                 bot.make_move(bot_move)
@@ -252,24 +2602,117 @@ def play_cli(depth=3, play_as='white', bot_vs_bot=False):
             if not bot_vs_bot:
                 continue
         if not bot_vs_bot:
+            if searcher is not None and searcher.pondering is None:
+                searcher.ponder(bot.board, max_depth)
             user_move = input("Your move: ")
             if user_move.lower() == "quit":
                 break
             if bot.make_move(user_move):
+                if searcher is not None and searcher.ponder_hit(user_move, movetime_ms):
+                    print("(ponder hit)")
                 bot.print_board()
             else:
                 print("Invalid or illegal move.")
     print("Game over!")
+    if searcher is not None:
+        searcher.close()
     bot.close()
 
 if __name__ == "__main__":
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('--generate-cache', action='store_true', help='Generate move cache in background (no UI)')
     parser.add_argument('--depth', type=int, default=3, help='Search depth for MoonBot')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes for --generate-cache, --match and --analyse (default: all cores)')
+    parser.add_argument('--max-plies', type=int, default=4, help='Expand every reply up to this many plies for --generate-cache')
+    parser.add_argument('--max-positions', type=int, default=100000, help='Positions to search for --generate-cache')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore an existing cache file instead of resuming it')
+    parser.add_argument('--convert-cache', action='store_true', help=f'Convert move_sim_cache.json to the binary {POSITION_CACHE_FILE}')
+    parser.add_argument('--legacy-depth', type=int, default=None,
+                        help='Depth to record for --convert-cache entries without one (default: skip them)')
+    parser.add_argument('--generate-tablebases', nargs='*', default=None, metavar='SIGNATURE',
+                        help=f"Build endgame tablebases offline (default: {' '.join(TABLEBASE_SIGNATURES)})")
+    parser.add_argument('--tablebases', type=str, default=None, help=f'Tablebase directory to probe (and to write with --generate-tablebases, default {TABLEBASE_DIR})')
+    parser.add_argument('--position-cache', type=str, default=None, help='Binary position cache to consult before searching')
+    parser.add_argument('--movetime', type=int, default=None, help='Think time per move in ms (iterative deepening, overrides --depth)')
     parser.add_argument('--play-as', type=str, default='white', choices=['white', 'black'], help='Play as white or black (CLI)')
     parser.add_argument('--bot-vs-bot', action='store_true', help='Bot plays both sides automatically')
+    parser.add_argument('--ponder', action='store_true', help="Keep searching the predicted reply on the user's time (CLI)")
+    parser.add_argument('--match', type=int, default=None, metavar='GAMES', help='Play GAMES bot-vs-bot games between --engine-a and --engine-b')
+    parser.add_argument('--engine-a', type=str, default='depth=3', help='Match config, e.g. "depth=4" or "movetime=200,mobility=legal,engine=python"')
+    parser.add_argument('--engine-b', type=str, default='depth=3', help='Match config for the opponent')
+    parser.add_argument('--match-pgn', type=str, default='match.pgn', help='PGN file --match appends finished games to')
+    parser.add_argument('--sprt', type=float, nargs=2, default=[0.0, 5.0], metavar=('ELO0', 'ELO1'), help='SPRT hypotheses for --match')
+    parser.add_argument('--analyse', type=str, default=None, metavar='FILE', help='Analyse every FEN/EPD in FILE (uses --depth or --movetime, --workers)')
+    parser.add_argument('--static', action='store_true', help='With --analyse, only score material + PST in vectorized batches (no search)')
+    parser.add_argument('--analyse-out', type=str, default=None, help='JSONL file for --analyse results (default: stdout)')
+    parser.add_argument('--threads', type=int, default=1, help='Lazy SMP search processes for --uci')
+    parser.add_argument('--serve', action='store_true', help='Run a JSON-lines analysis server on localhost (uses --workers, --movetime as the default budget)')
+    parser.add_argument('--port', type=int, default=ANALYSIS_PORT, help='TCP port for --serve')
+    parser.add_argument('--server-cache', type=int, default=SERVER_CACHE_SIZE, help='Results the --serve LRU cache keeps')
+    parser.add_argument('--uci', action='store_true', help='Speak the UCI protocol on stdin/stdout (for chess GUIs)')
+    parser.add_argument('--profile', type=str, default=None, metavar='DIR',
+                        help='Write search stats JSON for every bot move to DIR (CLI without --ponder, and --uci)')
+    parser.add_argument('--profile-pstats', action='store_true', help='Also write a cProfile .pstats dump per search to the --profile directory')
+    parser.add_argument('--bench', action='store_true', help='Run perft and search benchmarks (uses --depth) and print JSON')
+    parser.add_argument('--perft-depth', type=int, default=3, help='Perft depth for --bench')
+    parser.add_argument('--bench-engine', default='both', choices=['python', 'cython', 'both'], help='Engine path(s) to benchmark')
+    parser.add_argument('--bench-json', type=str, default=None, help='Write --bench results to this file instead of stdout')
     args = parser.parse_args()
+    if args.uci:
+        UciEngine(threads=args.threads, profile=args.profile, profile_pstats=args.profile_pstats).run()
+        exit(0)
+    if args.serve:
+        serve_analysis(args.port, args.workers, args.server_cache, args.movetime)
+        exit(0)
+    if args.analyse:
+        out = open(args.analyse_out, 'w') if args.analyse_out else sys.stdout
+        start = time.perf_counter()
+        count = 0
+        if args.static:
+            results = static_scores(read_positions(args.analyse))
+        else:
+            results = analyse_many(read_positions(args.analyse), depth=args.depth, movetime_ms=args.movetime, workers=args.workers)
+        for result in results:
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            count += 1
+        if out is not sys.stdout:
+            out.close()
+        print(f"Analysed {count} positions in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        exit(0)
+    if args.match:
+        results = run_match(args.engine_a, args.engine_b, games=args.match, pgn_file=args.match_pgn,
+                            workers=args.workers, elo0=args.sprt[0], elo1=args.sprt[1])
+        print(json.dumps(results, indent=2))
+        exit(0)
+    if args.bench:
+        engines = ('python', 'cython') if args.bench_engine == 'both' else (args.bench_engine,)
+        results = run_bench(search_depth=args.depth, perft_depth=args.perft_depth, engines=engines)
+        if args.bench_json:
+            with open(args.bench_json, 'w') as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        ok = all(row['ok'] for result in results.values() for row in result['perft'])
+        exit(0 if ok else 1)
     if args.generate_cache:
-        generate_move_cache(depth=args.depth)
+        generate_move_cache(depth=args.depth, max_positions=args.max_positions, max_plies=args.max_plies,
+                            workers=args.workers, resume=not args.no_resume)
+        exit(0)
+    if args.generate_tablebases is not None:
+        build_tablebases(args.generate_tablebases or TABLEBASE_SIGNATURES, args.tablebases or TABLEBASE_DIR)
+        exit(0)
+    if args.convert_cache:
+        count, skipped = convert_move_cache('move_sim_cache.json', POSITION_CACHE_FILE, args.legacy_depth)
+        if skipped:
+            print(f"Skipped {skipped} entries with no recorded search depth; "
+                  f"pass --legacy-depth N to import them as depth N.", file=sys.stderr)
+        if not count:
+            print(f"No positions to convert; {POSITION_CACHE_FILE} was not written.", file=sys.stderr)
+            exit(1)
+        print(f"Wrote {count} positions to {POSITION_CACHE_FILE}.")
         exit(0)
-    play_cli(depth=args.depth, play_as=args.play_as, bot_vs_bot=args.bot_vs_bot)
+    play_cli(depth=args.depth, play_as=args.play_as, bot_vs_bot=args.bot_vs_bot, movetime_ms=args.movetime,
+             position_cache=args.position_cache, ponder=args.ponder, tablebases=args.tablebases,
+             profile=args.profile, profile_pstats=args.profile_pstats)
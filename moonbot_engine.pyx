@@ -1,36 +1,979 @@
 # distutils: language = c++
-import numpy as np
-cimport numpy as np
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+import time
+import chess.polyglot
 from libc.stdint cimport uint64_t
+from libcpp.vector cimport vector
+
+cdef extern from *:
+    int popcount "__builtin_popcountll"(unsigned long long) nogil
+    int ctz "__builtin_ctzll"(unsigned long long) nogil
+    int clz "__builtin_clzll"(unsigned long long) nogil
+
+cdef enum:
+    WHITE = 0
+    BLACK = 1
+
+# Piece types are python-chess types minus one; a piece is color * 6 + type
+cdef enum:
+    PAWN = 0
+    KNIGHT = 1
+    BISHOP = 2
+    ROOK = 3
+    QUEEN = 4
+    KING = 5
+    EMPTY = -1
+
+# Moves are ints: from | to << 6 | promotion type << 12 | flags
+cdef enum:
+    FLAG_EP = 1 << 15
+    FLAG_CASTLE = 1 << 16
+    FLAG_DOUBLE = 1 << 17
+
+cdef enum:
+    MATE_SCORE = 99999
+    MATE_BOUND = MATE_SCORE - 1000
+    INFINITE = 100000
+    MAX_MOVES = 256
+    MAX_PLY = 128
+    # Same bins as moonbot.CUTOFF_INDEX_BINS
+    CUTOFF_INDEX_BINS = 16
+    DELTA_MARGIN = 200
+    MOBILITY_WEIGHT = 5
+    # Same selectivity as moonbot's NULL_MOVE_* and LMR_* settings
+    NULL_MOVE_MIN_DEPTH = 3
+    NULL_MOVE_REDUCTION = 2
+    LMR_MIN_INDEX = 3
+    LMR_MIN_DEPTH = 3
+    # Move ordering bands: hash move, winning captures, promotions, killers,
+    # quiets by history (kept below the killers), losing captures
+    ORDER_HASH = 1000000
+    ORDER_KILLER = 80000
+    ORDER_LOSING = 200000
+    TT_EXACT = 0
+    TT_LOWER = 1
+    TT_UPPER = 2
+
+cdef int PIECE_VALUES[6]
+PIECE_VALUES[:] = [100, 320, 330, 500, 900, 0]
+
+cdef uint64_t KNIGHT_ATTACKS[64]
+cdef uint64_t KING_ATTACKS[64]
+cdef uint64_t PAWN_ATTACKS[2][64]
+# Rays for N, E, NE, NW (towards higher squares) and S, W, SE, SW
+cdef uint64_t RAYS[8][64]
+cdef int CASTLING_MASK[64]
+# Polyglot keys, so zobrist_key() matches chess.polyglot.zobrist_hash
+cdef uint64_t ZOBRIST_PIECE[12][64]
+cdef uint64_t ZOBRIST_CASTLING[16]
+cdef uint64_t ZOBRIST_EP[8]
+cdef uint64_t ZOBRIST_TURN
+
+cdef struct Undo:
+    int move
+    int captured
+    int castling
+    int ep
+    int halfmove
+    uint64_t piece_key
+    uint64_t key
+
+# TT entries are two 64-bit words, (key ^ data, data), so an entry torn by a
+# concurrent writer in a shared table fails the key check instead of
+# returning another position's data. data packs move (18 bits), score +
+# TT_SCORE_OFFSET (18 bits), depth (8 bits), flag (2 bits) and generation
+# (6 bits), exactly as moonbot's SharedTranspositionTable does. The move is
+# stored without our flag bits as from | to << 6 | promotion << 12, with the
+# python-chess piece type (ours + 1), and TT moves are compared in that form.
+cdef enum:
+    TT_SCORE_OFFSET = 1 << 17
+
+cdef inline int tt_move_code(int move):
+    cdef int promotion = (move >> 12) & 7
+    return (move & 0xFFF) | ((promotion + 1) << 12 if promotion else 0)
+
+cdef inline uint64_t tt_pack(int move, int score, int depth, int flag, int generation):
+    return (<uint64_t>tt_move_code(move) | ((<uint64_t>(score + TT_SCORE_OFFSET) & 0x3FFFF) << 18)
+            | ((<uint64_t>depth & 0xFF) << 36) | ((<uint64_t>flag & 3) << 44) | ((<uint64_t>generation & 63) << 46))
+
+cdef inline int tt_move_of(uint64_t data):
+    # A tt_move_code(), or 0
+    return <int>(data & 0x3FFFF)
+
+cdef inline int tt_score(uint64_t data):
+    return <int>((data >> 18) & 0x3FFFF) - TT_SCORE_OFFSET
+
+cdef inline int tt_depth(uint64_t data):
+    return <int>((data >> 36) & 0xFF)
+
+cdef inline int tt_flag(uint64_t data):
+    return <int>((data >> 44) & 3)
+
+cdef inline int tt_generation(uint64_t data):
+    return <int>(data >> 46)
+
+cdef uint64_t leaper(int sq, int* df, int* dr, int n):
+    cdef uint64_t attacks = 0
+    cdef int i, f, r
+    for i in range(n):
+        f = sq % 8 + df[i]
+        r = sq // 8 + dr[i]
+        if 0 <= f < 8 and 0 <= r < 8:
+            attacks |= (<uint64_t>1) << (r * 8 + f)
+    return attacks
+
+cdef void init_tables():
+    cdef int knight_df[8]
+    cdef int knight_dr[8]
+    cdef int king_df[8]
+    cdef int king_dr[8]
+    cdef int ray_df[8]
+    cdef int ray_dr[8]
+    cdef int white_pawn_df[2]
+    cdef int white_pawn_dr[2]
+    cdef int black_pawn_dr[2]
+    cdef int sq, d, f, r, i
+    knight_df[:] = [1, 2, 2, 1, -1, -2, -2, -1]
+    knight_dr[:] = [2, 1, -1, -2, -2, -1, 1, 2]
+    king_df[:] = [1, 1, 1, 0, -1, -1, -1, 0]
+    king_dr[:] = [1, 0, -1, -1, -1, 0, 1, 1]
+    ray_df[:] = [0, 1, 1, -1, 0, -1, 1, -1]
+    ray_dr[:] = [1, 0, 1, 1, -1, 0, -1, -1]
+    white_pawn_df[:] = [-1, 1]
+    white_pawn_dr[:] = [1, 1]
+    black_pawn_dr[:] = [-1, -1]
+    for sq in range(64):
+        KNIGHT_ATTACKS[sq] = leaper(sq, knight_df, knight_dr, 8)
+        KING_ATTACKS[sq] = leaper(sq, king_df, king_dr, 8)
+        PAWN_ATTACKS[WHITE][sq] = leaper(sq, white_pawn_df, white_pawn_dr, 2)
+        PAWN_ATTACKS[BLACK][sq] = leaper(sq, white_pawn_df, black_pawn_dr, 2)
+        for d in range(8):
+            RAYS[d][sq] = 0
+            f = sq % 8 + ray_df[d]
+            r = sq // 8 + ray_dr[d]
+            while 0 <= f < 8 and 0 <= r < 8:
+                RAYS[d][sq] |= (<uint64_t>1) << (r * 8 + f)
+                f += ray_df[d]
+                r += ray_dr[d]
+        CASTLING_MASK[sq] = 15
+    CASTLING_MASK[0] = 15 & ~2
+    CASTLING_MASK[4] = 15 & ~3
+    CASTLING_MASK[7] = 15 & ~1
+    CASTLING_MASK[56] = 15 & ~8
+    CASTLING_MASK[60] = 15 & ~12
+    CASTLING_MASK[63] = 15 & ~4
+    array = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+    for i in range(12):
+        for sq in range(64):
+            # Polyglot orders pieces as black pawn, white pawn, black knight, ...
+            ZOBRIST_PIECE[i][sq] = array[64 * ((i % 6) * 2 + (1 if i < 6 else 0)) + sq]
+    for i in range(16):
+        ZOBRIST_CASTLING[i] = 0
+        for d in range(4):
+            if i & (1 << d):
+                ZOBRIST_CASTLING[i] ^= array[768 + d]
+    for f in range(8):
+        ZOBRIST_EP[f] = array[772 + f]
+    global ZOBRIST_TURN
+    ZOBRIST_TURN = array[780]
+
+init_tables()
+
+cdef inline uint64_t positive_ray(int d, int sq, uint64_t occupied):
+    cdef uint64_t attacks = RAYS[d][sq]
+    cdef uint64_t blockers = attacks & occupied
+    if blockers:
+        attacks ^= RAYS[d][ctz(blockers)]
+    return attacks
+
+cdef inline uint64_t negative_ray(int d, int sq, uint64_t occupied):
+    cdef uint64_t attacks = RAYS[d][sq]
+    cdef uint64_t blockers = attacks & occupied
+    if blockers:
+        attacks ^= RAYS[d][63 - clz(blockers)]
+    return attacks
+
+cdef inline uint64_t rook_attacks(int sq, uint64_t occupied):
+    return positive_ray(0, sq, occupied) | positive_ray(1, sq, occupied) | negative_ray(4, sq, occupied) | negative_ray(5, sq, occupied)
+
+cdef inline uint64_t bishop_attacks(int sq, uint64_t occupied):
+    return positive_ray(2, sq, occupied) | positive_ray(3, sq, occupied) | negative_ray(6, sq, occupied) | negative_ray(7, sq, occupied)
+
+cdef inline int move_from(int move):
+    return move & 63
+
+cdef inline int move_to(int move):
+    return (move >> 6) & 63
+
+cdef inline int move_promotion(int move):
+    # Piece type (KNIGHT..QUEEN) or 0
+    return (move >> 12) & 7
 
 cdef class BitboardMoonBot:
-    def __init__(self):
-        self.white_pieces = np.zeros(6, dtype=np.uint64)
-        self.black_pieces = np.zeros(6, dtype=np.uint64)
-        self.turn = 0
-        # TODO: initialize bitboards for starting position
+    cdef uint64_t bb[12]
+    cdef uint64_t occ[2]
+    cdef int squares[64]
+    cdef int pst[12][64]
+    cdef public int turn
+    cdef int castling
+    cdef int ep
+    cdef int halfmove
+    cdef uint64_t piece_key
+    cdef vector[Undo] undo
+    cdef vector[uint64_t] tt_words
+    # Points into tt_words, or into a buffer given to attach_tt
+    cdef uint64_t* tt
+    cdef uint64_t tt_mask
+    cdef object tt_buffer
+    # Written into every entry; deeper entries of the current generation are
+    # not replaced. Bumped per search, except in an attached table, where the
+    # owner (e.g. moonbot.LazySMP) sets it for all the engines sharing it
+    cdef public int generation
+    cdef public long nodes
+    cdef public long tt_probes
+    cdef public long tt_hits
+    cdef public long qnodes
+    cdef public long evals
+    # Beta cutoffs by the index of the legal move that caused them
+    cdef long cutoff_counts[CUTOFF_INDEX_BINS]
+    cdef double deadline
+    cdef bint stopped
+    # Any object with is_set() (e.g. a multiprocessing.Event); aborts the search when set
+    cdef public object stop_event
+    # Set by Lazy SMP helpers to vary the root move order
+    cdef public int root_rotation
+    # tb_probe(fen, ply) -> score or None, called at interior nodes with at
+    # most tb_pieces pieces (e.g. moonbot.Tablebases.score on a chess.Board)
+    cdef public object tb_probe
+    cdef public int tb_pieces
+    cdef int killers[MAX_PLY][2]
+    # History scores indexed by from_square * 64 + to_square, as MoonBot.history
+    cdef int history[4096]
+    cdef int root_best
 
-    cpdef int evaluate(self):
-        cdef np.ndarray[np.uint64_t, ndim=1] white = self.white_pieces
-        cdef np.ndarray[np.uint64_t, ndim=1] black = self.black_pieces
-        cdef int score = 0
-        # TODO: implement fast bitwise evaluation
-        return score
+    def __init__(self, pst=None, int tt_bits=20):
+        # pst: (12, 64) material + piece-square scores from White's point of
+        # view (moonbot.PST); plain material values when omitted
+        cdef int i, sq
+        for i in range(12):
+            for sq in range(64):
+                if pst is None:
+                    self.pst[i][sq] = PIECE_VALUES[i % 6] if i < 6 else -PIECE_VALUES[i % 6]
+                else:
+                    self.pst[i][sq] = pst[i][sq]
+        self.tt_words.resize(2 << tt_bits)
+        self.tt = self.tt_words.data()
+        self.tt_mask = (1 << tt_bits) - 1
+        self.tt_buffer = None
+        self.generation = 0
+        self.stop_event = None
+        self.root_rotation = 0
+        self.tb_probe = None
+        self.tb_pieces = 0
+        for i in range(4096):
+            self.history[i] = 0
+        self.set_fen(chess.STARTING_FEN)
 
-    cpdef tuple negamax(self, int depth, int alpha, int beta):
-        cdef np.ndarray[np.uint64_t, ndim=1] white = self.white_pieces
-        cdef np.ndarray[np.uint64_t, ndim=1] black = self.black_pieces
-        # TODO: implement fast bitboard negamax search
-        return (0, None)
+    # --- Board state ---
+
+    cdef inline void put_piece(self, int sq, int piece):
+        cdef uint64_t bit = (<uint64_t>1) << sq
+        self.bb[piece] |= bit
+        self.occ[piece // 6] |= bit
+        self.squares[sq] = piece
+        self.piece_key ^= ZOBRIST_PIECE[piece][sq]
+
+    cdef inline void remove_piece(self, int sq):
+        cdef int piece = self.squares[sq]
+        cdef uint64_t bit = (<uint64_t>1) << sq
+        self.bb[piece] &= ~bit
+        self.occ[piece // 6] &= ~bit
+        self.squares[sq] = EMPTY
+        self.piece_key ^= ZOBRIST_PIECE[piece][sq]
+
+    cpdef void set_fen(self, str fen):
+        cdef int i, sq, rank, file
+        fields = fen.split()
+        for i in range(12):
+            self.bb[i] = 0
+        self.occ[0] = self.occ[1] = 0
+        for sq in range(64):
+            self.squares[sq] = EMPTY
+        self.piece_key = 0
+        rank, file = 7, 0
+        for ch in fields[0]:
+            if ch == '/':
+                rank -= 1
+                file = 0
+            elif ch.isdigit():
+                file += int(ch)
+            else:
+                self.put_piece(rank * 8 + file, 'pnbrqk'.index(ch.lower()) + (0 if ch.isupper() else 6))
+                file += 1
+        self.turn = WHITE if len(fields) < 2 or fields[1] == 'w' else BLACK
+        self.castling = 0
+        rights = fields[2] if len(fields) > 2 else '-'
+        for i, ch in enumerate('KQkq'):
+            if ch in rights:
+                self.castling |= 1 << i
+        self.ep = chess.parse_square(fields[3]) if len(fields) > 3 and fields[3] != '-' else -1
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.undo.clear()
+
+    cpdef str fen(self):
+        # Full move number is not tracked and always written as 1
+        cdef int rank, file, piece, empty
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                piece = self.squares[rank * 8 + file]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += 'PNBRQK'[piece] if piece < 6 else 'pnbrqk'[piece - 6]
+            rows.append(row + (str(empty) if empty else ''))
+        rights = ''
+        for file in range(4):
+            if self.castling & (1 << file):
+                rights += 'KQkq'[file]
+        ep = chess.SQUARE_NAMES[self.ep] if self.ep >= 0 else '-'
+        return f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {rights or '-'} {ep} {self.halfmove} 1"
+
+    cpdef unsigned long long zobrist_key(self):
+        cdef uint64_t key = self.piece_key ^ ZOBRIST_CASTLING[self.castling]
+        cdef uint64_t adjacent
+        if self.ep >= 0:
+            # Polyglot only hashes the ep file when a pawn can actually capture
+            adjacent = PAWN_ATTACKS[1 - self.turn][self.ep] & self.bb[self.turn * 6 + PAWN]
+            if adjacent:
+                key ^= ZOBRIST_EP[self.ep % 8]
+        if self.turn == WHITE:
+            key ^= ZOBRIST_TURN
+        return key
+
+    cdef bint is_attacked(self, int sq, int by):
+        cdef uint64_t occupied = self.occ[0] | self.occ[1]
+        cdef int base = by * 6
+        if PAWN_ATTACKS[1 - by][sq] & self.bb[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & self.bb[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & self.bb[base + KING]:
+            return True
+        if bishop_attacks(sq, occupied) & (self.bb[base + BISHOP] | self.bb[base + QUEEN]):
+            return True
+        if rook_attacks(sq, occupied) & (self.bb[base + ROOK] | self.bb[base + QUEEN]):
+            return True
+        return False
+
+    cdef inline bint in_check(self, int color):
+        cdef uint64_t king = self.bb[color * 6 + KING]
+        return king != 0 and self.is_attacked(ctz(king), 1 - color)
+
+    cdef void make(self, int move):
+        cdef int from_sq = move_from(move)
+        cdef int to_sq = move_to(move)
+        cdef int promotion = move_promotion(move)
+        cdef int us = self.turn
+        cdef int piece = self.squares[from_sq]
+        cdef int captured_sq = to_sq
+        cdef Undo u
+        if move & FLAG_EP:
+            captured_sq = to_sq - 8 if us == WHITE else to_sq + 8
+        u.move = move
+        u.captured = self.squares[captured_sq]
+        u.castling = self.castling
+        u.ep = self.ep
+        u.halfmove = self.halfmove
+        u.piece_key = self.piece_key
+        u.key = self.zobrist_key()
+        self.undo.push_back(u)
+        if u.captured != EMPTY:
+            self.remove_piece(captured_sq)
+        self.remove_piece(from_sq)
+        self.put_piece(to_sq, us * 6 + promotion if promotion else piece)
+        if move & FLAG_CASTLE:
+            if to_sq > from_sq:
+                self.remove_piece(to_sq + 1)
+                self.put_piece(to_sq - 1, us * 6 + ROOK)
+            else:
+                self.remove_piece(to_sq - 2)
+                self.put_piece(to_sq + 1, us * 6 + ROOK)
+        self.castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        self.ep = (from_sq + to_sq) // 2 if move & FLAG_DOUBLE else -1
+        if piece % 6 == PAWN or u.captured != EMPTY:
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        self.turn = 1 - us
+
+    cdef void make_null(self):
+        # Passes the turn; stored as move 0, which no real move encodes (a1a1)
+        cdef Undo u
+        u.move = 0
+        u.captured = EMPTY
+        u.castling = self.castling
+        u.ep = self.ep
+        u.halfmove = self.halfmove
+        u.piece_key = self.piece_key
+        u.key = self.zobrist_key()
+        self.undo.push_back(u)
+        self.ep = -1
+        self.halfmove += 1
+        self.turn = 1 - self.turn
+
+    cdef void unmake(self):
+        cdef Undo u = self.undo.back()
+        self.undo.pop_back()
+        if not u.move:
+            self.turn = 1 - self.turn
+            self.ep = u.ep
+            self.halfmove = u.halfmove
+            return
+        cdef int move = u.move
+        cdef int from_sq = move_from(move)
+        cdef int to_sq = move_to(move)
+        cdef int us = 1 - self.turn
+        cdef int piece = self.squares[to_sq]
+        self.turn = us
+        if move_promotion(move):
+            piece = us * 6 + PAWN
+        self.remove_piece(to_sq)
+        self.put_piece(from_sq, piece)
+        if u.captured != EMPTY:
+            if move & FLAG_EP:
+                self.put_piece(to_sq - 8 if us == WHITE else to_sq + 8, u.captured)
+            else:
+                self.put_piece(to_sq, u.captured)
+        if move & FLAG_CASTLE:
+            if to_sq > from_sq:
+                self.remove_piece(to_sq - 1)
+                self.put_piece(to_sq + 1, us * 6 + ROOK)
+            else:
+                self.remove_piece(to_sq + 1)
+                self.put_piece(to_sq - 2, us * 6 + ROOK)
+        self.castling = u.castling
+        self.ep = u.ep
+        self.halfmove = u.halfmove
+        self.piece_key = u.piece_key
+
+    cdef bint is_repetition(self):
+        # Scans back to the last irreversible move, or the last null move
+        cdef uint64_t key = self.zobrist_key()
+        cdef int n = self.undo.size()
+        cdef int i = n - 2
+        while i >= 0 and i >= n - self.halfmove:
+            if not self.undo[i].move or not self.undo[i + 1].move:
+                return False
+            if self.undo[i].key == key:
+                return True
+            i -= 2
+        return False
+
+    # --- Move generation ---
+
+    cdef inline int add_targets(self, int* moves, int n, int from_sq, uint64_t targets):
+        while targets:
+            moves[n] = from_sq | (ctz(targets) << 6)
+            n += 1
+            targets &= targets - 1
+        return n
+
+    cdef inline int add_pawn_move(self, int* moves, int n, int from_sq, int to_sq, int flags, bint captures_only):
+        cdef int promotion
+        if to_sq >= 56 or to_sq < 8:
+            if captures_only:
+                moves[n] = from_sq | (to_sq << 6) | (QUEEN << 12)
+                return n + 1
+            for promotion in range(QUEEN, PAWN, -1):
+                moves[n] = from_sq | (to_sq << 6) | (promotion << 12)
+                n += 1
+            return n
+        moves[n] = from_sq | (to_sq << 6) | flags
+        return n + 1
+
+    cdef int generate(self, int* moves, bint captures_only):
+        # Pseudo-legal moves; captures_only yields captures and queen promotions
+        cdef int us = self.turn
+        cdef int them = 1 - us
+        cdef int base = us * 6
+        cdef uint64_t own = self.occ[us]
+        cdef uint64_t enemy = self.occ[them]
+        cdef uint64_t occupied = own | enemy
+        cdef uint64_t targets_mask = enemy if captures_only else ~own
+        cdef uint64_t pieces, targets
+        cdef int n = 0
+        cdef int sq, to_sq
+        cdef int forward = 8 if us == WHITE else -8
+        cdef int start_rank = 1 if us == WHITE else 6
+        cdef int last_rank = 6 if us == WHITE else 1
+        pieces = self.bb[base + PAWN]
+        while pieces:
+            sq = ctz(pieces)
+            pieces &= pieces - 1
+            to_sq = sq + forward
+            if self.squares[to_sq] == EMPTY and (not captures_only or sq // 8 == last_rank):
+                n = self.add_pawn_move(moves, n, sq, to_sq, 0, captures_only)
+                if not captures_only and sq // 8 == start_rank and self.squares[to_sq + forward] == EMPTY:
+                    moves[n] = sq | ((to_sq + forward) << 6) | FLAG_DOUBLE
+                    n += 1
+            targets = PAWN_ATTACKS[us][sq] & enemy
+            while targets:
+                n = self.add_pawn_move(moves, n, sq, ctz(targets), 0, captures_only)
+                targets &= targets - 1
+            if self.ep >= 0 and PAWN_ATTACKS[us][sq] & ((<uint64_t>1) << self.ep):
+                moves[n] = sq | (self.ep << 6) | FLAG_EP
+                n += 1
+        pieces = self.bb[base + KNIGHT]
+        while pieces:
+            sq = ctz(pieces)
+            pieces &= pieces - 1
+            n = self.add_targets(moves, n, sq, KNIGHT_ATTACKS[sq] & targets_mask)
+        pieces = self.bb[base + BISHOP] | self.bb[base + QUEEN]
+        while pieces:
+            sq = ctz(pieces)
+            pieces &= pieces - 1
+            n = self.add_targets(moves, n, sq, bishop_attacks(sq, occupied) & targets_mask)
+        pieces = self.bb[base + ROOK] | self.bb[base + QUEEN]
+        while pieces:
+            sq = ctz(pieces)
+            pieces &= pieces - 1
+            n = self.add_targets(moves, n, sq, rook_attacks(sq, occupied) & targets_mask)
+        pieces = self.bb[base + KING]
+        if pieces:
+            sq = ctz(pieces)
+            n = self.add_targets(moves, n, sq, KING_ATTACKS[sq] & targets_mask)
+            if not captures_only and self.castling and not self.is_attacked(sq, them):
+                # Castling rights imply the king and rook are on their home squares
+                if self.castling & (1 if us == WHITE else 4) and not occupied & ((<uint64_t>0x60) << (sq - 4)) \
+                        and not self.is_attacked(sq + 1, them) and not self.is_attacked(sq + 2, them):
+                    moves[n] = sq | ((sq + 2) << 6) | FLAG_CASTLE
+                    n += 1
+                if self.castling & (2 if us == WHITE else 8) and not occupied & ((<uint64_t>0x0E) << (sq - 4)) \
+                        and not self.is_attacked(sq - 1, them) and not self.is_attacked(sq - 2, them):
+                    moves[n] = sq | ((sq - 2) << 6) | FLAG_CASTLE
+                    n += 1
+        return n
 
     cpdef list generate_legal_moves(self):
-        # TODO: implement fast bitboard move generation
-        return []
+        cdef int moves[MAX_MOVES]
+        cdef int n = self.generate(moves, False)
+        cdef int i
+        cdef int us = self.turn
+        legal = []
+        for i in range(n):
+            self.make(moves[i])
+            if not self.in_check(us):
+                legal.append(moves[i])
+            self.unmake()
+        return legal
+
+    cpdef unsigned long long perft(self, int depth):
+        cdef int moves[MAX_MOVES]
+        cdef int n = self.generate(moves, False)
+        cdef int i
+        cdef int us = self.turn
+        cdef unsigned long long nodes = 0
+        if depth <= 0:
+            return 1
+        for i in range(n):
+            self.make(moves[i])
+            if not self.in_check(us):
+                nodes += self.perft(depth - 1) if depth > 1 else 1
+            self.unmake()
+        return nodes
 
     cpdef void push(self, int move):
-        # TODO: update bitboards for move
-        pass
+        self.make(move)
 
     cpdef void pop(self):
-        # TODO: undo last move
-        pass
+        if self.undo.size():
+            self.unmake()
+
+    cpdef int parse_uci(self, str uci):
+        # Legal move matching a UCI string, or 0
+        for move in self.generate_legal_moves():
+            if self.move_to_uci(move) == uci:
+                return move
+        return 0
+
+    cpdef str move_to_uci(self, int move):
+        uci = chess.SQUARE_NAMES[move_from(move)] + chess.SQUARE_NAMES[move_to(move)]
+        if move_promotion(move):
+            uci += 'pnbrqk'[move_promotion(move)]
+        return uci
+
+    cpdef bint push_uci(self, str uci):
+        cdef int move = self.parse_uci(uci)
+        if not move:
+            return False
+        self.make(move)
+        return True
+
+    # --- Evaluation ---
+
+    cpdef int evaluate(self):
+        # Material + PST + attack mobility, from the side to move's point of view
+        cdef int score = 0
+        cdef int piece, sq, color
+        cdef uint64_t pieces, own
+        cdef uint64_t occupied = self.occ[0] | self.occ[1]
+        cdef int mobility[2]
+        for piece in range(12):
+            pieces = self.bb[piece]
+            while pieces:
+                score += self.pst[piece][ctz(pieces)]
+                pieces &= pieces - 1
+        for color in range(2):
+            own = self.occ[color]
+            mobility[color] = 0
+            pieces = self.bb[color * 6 + KNIGHT]
+            while pieces:
+                mobility[color] += popcount(KNIGHT_ATTACKS[ctz(pieces)] & ~own)
+                pieces &= pieces - 1
+            pieces = self.bb[color * 6 + BISHOP] | self.bb[color * 6 + QUEEN]
+            while pieces:
+                mobility[color] += popcount(bishop_attacks(ctz(pieces), occupied) & ~own)
+                pieces &= pieces - 1
+            pieces = self.bb[color * 6 + ROOK] | self.bb[color * 6 + QUEEN]
+            while pieces:
+                mobility[color] += popcount(rook_attacks(ctz(pieces), occupied) & ~own)
+                pieces &= pieces - 1
+        score += MOBILITY_WEIGHT * (mobility[WHITE] - mobility[BLACK])
+        return score if self.turn == WHITE else -score
+
+    # --- Search ---
+
+    cdef inline int order_score(self, int move, int tt_move, int ply):
+        cdef int victim
+        if tt_move and tt_move_code(move) == tt_move:
+            return ORDER_HASH
+        if move & FLAG_EP:
+            return 100000 + 10 * PAWN
+        victim = self.squares[move_to(move)]
+        if victim != EMPTY:
+            return 100000 + 10 * (victim % 6) - self.squares[move_from(move)] % 6 + 10
+        if move_promotion(move):
+            return 90000 + move_promotion(move)
+        if move == self.killers[ply][0] or move == self.killers[ply][1]:
+            return ORDER_KILLER
+        return 0
+
+    cdef inline int capture_gain(self, int move):
+        cdef int victim
+        cdef int gain = 0
+        if move & FLAG_EP:
+            gain = PIECE_VALUES[PAWN]
+        else:
+            victim = self.squares[move_to(move)]
+            if victim != EMPTY:
+                gain = PIECE_VALUES[victim % 6]
+        if move_promotion(move):
+            gain += PIECE_VALUES[move_promotion(move)] - PIECE_VALUES[PAWN]
+        return gain
+
+    cdef inline void check_time(self):
+        if self.nodes & 4095:
+            return
+        if self.deadline > 0 and time.perf_counter() > self.deadline:
+            self.stopped = True
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+
+    cdef int quiesce(self, int alpha, int beta, int ply):
+        cdef int moves[MAX_MOVES]
+        cdef int scores[MAX_MOVES]
+        cdef int n, i, j, best_index, move, score
+        cdef int us = self.turn
+        cdef int stand_pat
+        self.nodes += 1
+        self.qnodes += 1
+        self.check_time()
+        if self.stopped:
+            return 0
+        self.evals += 1
+        stand_pat = self.evaluate()
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        n = self.generate(moves, True)
+        for i in range(n):
+            scores[i] = self.order_score(moves[i], 0, ply)
+        for i in range(n):
+            best_index = i
+            for j in range(i + 1, n):
+                if scores[j] > scores[best_index]:
+                    best_index = j
+            move = moves[best_index]
+            moves[best_index], scores[best_index] = moves[i], scores[i]
+            # Delta pruning: even winning the piece cannot reach alpha
+            if stand_pat + self.capture_gain(move) + DELTA_MARGIN <= alpha:
+                continue
+            self.make(move)
+            if self.in_check(us):
+                self.unmake()
+                continue
+            score = -self.quiesce(-beta, -alpha, ply + 1)
+            self.unmake()
+            if self.stopped:
+                return 0
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    cdef int search(self, int depth, int alpha, int beta, int ply, bint allow_null=True):
+        # Principal variation search with null-move pruning and late move
+        # reductions, as MoonBot._negamax
+        cdef int moves[MAX_MOVES]
+        cdef int scores[MAX_MOVES]
+        cdef int n, i, j, best_index, move, score, legal, reduction
+        cdef int us = self.turn
+        cdef int alpha_orig = alpha
+        cdef int best_score = -INFINITE
+        cdef int best_move = 0
+        cdef int tt_move = 0
+        cdef int flag
+        cdef bint checked, quiet
+        cdef bint pv_node = beta - alpha > 1
+        cdef uint64_t key, data, index
+        self.nodes += 1
+        self.check_time()
+        if self.stopped:
+            return 0
+        if ply and (self.halfmove >= 100 or self.is_repetition()):
+            return 0
+        if ply and self.tb_probe is not None and popcount(self.occ[0] | self.occ[1]) <= self.tb_pieces:
+            result = self.tb_probe(self.fen(), ply)
+            if result is not None:
+                return result
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self.quiesce(alpha, beta, ply)
+        key = self.zobrist_key()
+        index = (key & self.tt_mask) << 1
+        data = self.tt[index + 1]
+        self.tt_probes += 1
+        if data and self.tt[index] ^ data == key:
+            self.tt_hits += 1
+            tt_move = tt_move_of(data)
+            if ply and tt_depth(data) >= depth:
+                score = tt_score(data)
+                flag = tt_flag(data)
+                if score >= MATE_BOUND:
+                    score -= ply
+                elif score <= -MATE_BOUND:
+                    score += ply
+                if flag == TT_EXACT or (flag == TT_LOWER and score >= beta) or (flag == TT_UPPER and score <= alpha):
+                    return score
+        checked = self.in_check(us)
+        # Null move pruning. Skipped when the side to move only has pawns left,
+        # where passing may be better than any move (zugzwang).
+        if (allow_null and ply and not pv_node and not checked and depth >= NULL_MOVE_MIN_DEPTH
+                and self.occ[us] & ~(self.bb[us * 6 + PAWN] | self.bb[us * 6 + KING])):
+            self.evals += 1
+            if self.evaluate() >= beta:
+                reduction = NULL_MOVE_REDUCTION + (depth >= 6)
+                self.make_null()
+                score = -self.search(depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+                self.unmake()
+                if self.stopped:
+                    return 0
+                if score >= beta:
+                    # Unproven mates from a null-move search are not trusted
+                    return beta if score >= MATE_BOUND else score
+        n = self.generate(moves, False)
+        for i in range(n):
+            move = moves[i]
+            scores[i] = self.order_score(move, tt_move, ply)
+            if scores[i] == 0:
+                # Quiets by history; Lazy SMP helpers each try the root's in a different order
+                if ply == 0 and self.root_rotation:
+                    scores[i] = (i + self.root_rotation) % n
+                else:
+                    scores[i] = min(self.history[move & 0xFFF], ORDER_KILLER - 1)
+            elif (scores[i] < ORDER_HASH and (self.squares[move_to(move)] != EMPTY or move & FLAG_EP)
+                    and not move_promotion(move)
+                    and self.capture_gain(move) < PIECE_VALUES[self.squares[move_from(move)] % 6]
+                    and self.is_attacked(move_to(move), 1 - us)):
+                # A bigger piece taking a defended smaller one goes after the quiets
+                scores[i] -= ORDER_LOSING
+        legal = 0
+        for i in range(n):
+            best_index = i
+            for j in range(i + 1, n):
+                if scores[j] > scores[best_index]:
+                    best_index = j
+            move = moves[best_index]
+            moves[best_index], scores[best_index] = moves[i], scores[i]
+            self.make(move)
+            if self.in_check(us):
+                self.unmake()
+                continue
+            legal += 1
+            if legal == 1:
+                score = -self.search(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late quiet moves are searched shallower first
+                quiet = self.undo.back().captured == EMPTY and not move_promotion(move)
+                reduction = 0
+                if (depth >= LMR_MIN_DEPTH and legal - 1 >= LMR_MIN_INDEX and quiet and not checked
+                        and move != self.killers[ply][0] and move != self.killers[ply][1] and not self.in_check(self.turn)):
+                    reduction = 1 + (depth >= 6 and legal - 1 >= 2 * LMR_MIN_INDEX)
+                # Null window: only prove the move is no better than alpha
+                score = -self.search(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if score > alpha and reduction and not self.stopped:
+                    score = -self.search(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta and not self.stopped:
+                    score = -self.search(depth - 1, -beta, -alpha, ply + 1)
+            self.unmake()
+            if self.stopped:
+                return 0
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoff_counts[min(legal - 1, CUTOFF_INDEX_BINS - 1)] += 1
+                        if self.squares[move_to(move)] == EMPTY and not move & FLAG_EP and not move_promotion(move):
+                            if self.killers[ply][0] != move:
+                                self.killers[ply][1] = self.killers[ply][0]
+                                self.killers[ply][0] = move
+                            self.history[move & 0xFFF] += depth * depth
+                        break
+        if not legal:
+            return -(MATE_SCORE - ply) if checked else 0
+        if ply == 0:
+            self.root_best = best_move
+        if best_score <= alpha_orig:
+            flag = TT_UPPER
+        elif best_score >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        # Depth-preferred: keep a deeper entry of this generation for another position
+        data = self.tt[index + 1]
+        if data and self.tt[index] ^ data != key and depth < tt_depth(data) and tt_generation(data) == self.generation & 63:
+            return best_score
+        score = best_score + ply if best_score >= MATE_BOUND else (best_score - ply if best_score <= -MATE_BOUND else best_score)
+        data = tt_pack(best_move, score, depth, flag, self.generation)
+        self.tt[index + 1] = data
+        self.tt[index] = key ^ data
+        return best_score
+
+    cdef void reset_search(self, double deadline):
+        cdef int i
+        self.nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.qnodes = 0
+        self.evals = 0
+        for i in range(CUTOFF_INDEX_BINS):
+            self.cutoff_counts[i] = 0
+        self.stopped = False
+        self.deadline = deadline
+        self.root_best = 0
+        if self.tt_buffer is None:
+            self.generation += 1
+        for i in range(MAX_PLY):
+            self.killers[i][0] = self.killers[i][1] = 0
+        # History carries over between searches but decays
+        for i in range(4096):
+            self.history[i] >>= 1
+
+    cpdef tuple negamax(self, int depth, int alpha, int beta):
+        # Fixed-depth search; returns (score, best move as UCI or None)
+        self.reset_search(0)
+        score = self.search(depth, alpha, beta, 0)
+        return score, (self.move_to_uci(self.root_best) if self.root_best else None)
+
+    cpdef list principal_variation(self, int max_len):
+        # Best line as UCI strings, following TT moves until a miss or an illegal move
+        cdef uint64_t key, data, index
+        cdef int code, move
+        pv = []
+        while len(pv) < max_len:
+            key = self.zobrist_key()
+            index = (key & self.tt_mask) << 1
+            data = self.tt[index + 1]
+            code = tt_move_of(data)
+            if not data or self.tt[index] ^ data != key or not code:
+                break
+            move = 0
+            for legal_move in self.generate_legal_moves():
+                if tt_move_code(legal_move) == code:
+                    move = legal_move
+                    break
+            if not move:
+                break
+            pv.append(self.move_to_uci(move))
+            self.make(move)
+        for _ in pv:
+            self.unmake()
+        return pv
+
+    cpdef tuple iterative_deepening(self, int max_depth, double movetime_ms=0, object on_iteration=None, object depths=None):
+        # Returns (score, best move as UCI or None, completed depth). With
+        # movetime_ms the last iteration is abandoned at the deadline.
+        # on_iteration(depth, score, pv, nodes) is called after each completed depth.
+        # Lazy SMP helpers pass their own depths to stagger their iterations.
+        cdef int depth, score
+        cdef int best_score = 0
+        cdef int best_move = 0
+        cdef int completed = 0
+        cdef double start = time.perf_counter()
+        self.reset_search(0)
+        for depth in (range(1, max_depth + 1) if depths is None else depths):
+            score = self.search(depth, -INFINITE, INFINITE, 0)
+            if self.stopped:
+                break
+            completed = depth
+            best_score, best_move = score, self.root_best
+            if on_iteration is not None and best_move:
+                on_iteration(depth, best_score, self.principal_variation(depth), self.nodes)
+            if not best_move or best_score >= MATE_BOUND or best_score <= -MATE_BOUND:
+                break
+            if movetime_ms > 0:
+                # Depth 1 always completes; the clock only applies after it
+                self.deadline = start + movetime_ms / 1000
+                if time.perf_counter() - start > movetime_ms / 2000:
+                    break
+        return best_score, (self.move_to_uci(best_move) if best_move else None), completed
+
+    cpdef list cutoffs_by_index(self):
+        # Cutoff counts of the last search, as MoonBot.cutoff_counts
+        return [self.cutoff_counts[i] for i in range(CUTOFF_INDEX_BINS)]
+
+    cpdef int hashfull(self):
+        # Permille of the first 1000 TT slots in use
+        cdef int i, used = 0
+        cdef int sample = <int>min(<uint64_t>1000, self.tt_mask + 1)
+        for i in range(sample):
+            if self.tt[2 * i + 1]:
+                used += 1
+        return used * 1000 // sample
+
+    def attach_tt(self, buffer):
+        # Use a writable buffer of 2 * 2**n uint64 words (e.g. shared memory) as
+        # the transposition table, so several engines can search through one table
+        cdef uint64_t[::1] words = buffer
+        cdef size_t entries = words.shape[0] // 2
+        if entries == 0 or entries & (entries - 1):
+            raise ValueError("Transposition table size must be a power of two.")
+        self.tt_buffer = words
+        self.tt = &words[0]
+        self.tt_mask = entries - 1
+
+    def clear(self):
+        cdef uint64_t i
+        for i in range(2 * (self.tt_mask + 1)):
+            self.tt[i] = 0
+        for i in range(4096):
+            self.history[i] = 0
@@ -1,16 +1,17 @@
 import pygame
 import chess
 import sys
-import math
 import os
-import random
-import threading
 import json
-import urllib.request
+import chess.polyglot
+import functools
+import heapq
 import io
-import chess.pgn
-import concurrent.futures
-from moonbot import MoonBot  # Instead of defining MoonBot here, import it from moonbot.py
+import shutil
+import struct
+import tempfile
+import time
+from moonbot import MoonBot, SearchWorker, BitboardMoonBot, MATE_SCORE, MATE_BOUND  # Instead of defining MoonBot here, import it from moonbot.py
 
 # Constants
 WIDTH, HEIGHT = 480, 480
@@ -19,6 +20,8 @@ WHITE = (240, 217, 181)
 BROWN = (181, 136, 99)
 HIGHLIGHT = (186, 202, 68)
 FPS = 30
+MOVETIME_MS = 3000  # Per-move budget; the menu depth is the iterative-deepening cap
+PONDER = True  # Search the predicted reply while the user is thinking
 
 # Piece colors
 PIECE_WHITE = (60, 120, 255)  # Blue
@@ -112,19 +115,67 @@ def generate_piece_surface(piece, size):
                 pygame.draw.rect(surf, accent, (offset + x*px, offset + y*px, px, px), 1)
     return surf
 
+def load_piece_sprite(piece, size):
+    # Try to load the PNG sprite from assets, else use pixel art
+    sprite_path = os.path.join(ASSETS_DIR, PIECE_SPRITE_FILENAMES.get(piece, ''))
+    if os.path.exists(sprite_path):
+        try:
+            img = pygame.image.load(sprite_path).convert_alpha()
+            return pygame.transform.smoothscale(img, (size, size))
+        except Exception:
+            pass
+    return generate_piece_surface(piece, size)
+
+# Pieces are cut from one row of pre-scaled sprites, cached on disk per square size
+ATLAS_PIECES = 'PNBRQKpnbrqk'
+
+def sprite_atlas_path(size=SQUARE_SIZE):
+    return os.path.join(ASSETS_DIR, f'atlas_{size}.png')
+
+def sprite_signature(size=SQUARE_SIZE):
+    # Changes whenever a sprite is added, removed or edited
+    signature = [size]
+    for piece in ATLAS_PIECES:
+        try:
+            stat = os.stat(os.path.join(ASSETS_DIR, PIECE_SPRITE_FILENAMES[piece]))
+            signature.append([stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            signature.append(None)
+    return signature
+
+def build_sprite_atlas(size=SQUARE_SIZE):
+    atlas = pygame.Surface((size * len(ATLAS_PIECES), size), pygame.SRCALPHA)
+    for i, piece in enumerate(ATLAS_PIECES):
+        atlas.blit(load_piece_sprite(piece, size), (i * size, 0))
+    return atlas
+
+def load_sprite_atlas(size=SQUARE_SIZE):
+    # The cached atlas is used while its .json signature matches the sprites;
+    # otherwise it is rebuilt (decoding and scaling every sprite) and saved
+    path = sprite_atlas_path(size)
+    signature = sprite_signature(size)
+    try:
+        with open(path[:-4] + '.json') as f:
+            if json.load(f) == signature:
+                return pygame.image.load(path).convert_alpha()
+    except (OSError, ValueError, pygame.error):
+        pass
+    atlas = build_sprite_atlas(size)
+    try:
+        os.makedirs(ASSETS_DIR, exist_ok=True)
+        pygame.image.save(atlas, path[:-4] + '.tmp.png')
+        os.replace(path[:-4] + '.tmp.png', path)
+        with open(path[:-4] + '.json', 'w') as f:
+            json.dump(signature, f)
+    except (OSError, pygame.error):
+        # Read-only assets: the atlas is simply rebuilt on the next launch
+        pass
+    return atlas
+
 def load_images():
-    # Try to load PNG sprites from assets, else use pixel art
-    for piece in PIECE_PIXELS:
-        sprite_path = os.path.join(ASSETS_DIR, PIECE_SPRITE_FILENAMES.get(piece, ''))
-        if os.path.exists(sprite_path):
-            try:
-                img = pygame.image.load(sprite_path).convert_alpha()
-                img = pygame.transform.smoothscale(img, (SQUARE_SIZE, SQUARE_SIZE))
-                PIECE_IMAGES[piece] = img
-            except Exception:
-                PIECE_IMAGES[piece] = generate_piece_surface(piece, SQUARE_SIZE)
-        else:
-            PIECE_IMAGES[piece] = generate_piece_surface(piece, SQUARE_SIZE)
+    atlas = load_sprite_atlas(SQUARE_SIZE)
+    for i, piece in enumerate(ATLAS_PIECES):
+        PIECE_IMAGES[piece] = atlas.subsurface((i * SQUARE_SIZE, 0, SQUARE_SIZE, SQUARE_SIZE))
 
 # --- Common chess openings for book moves ---
 OPENING_BOOK = [
@@ -149,65 +200,326 @@ OPENING_BOOK = [
 # (Cython optimization support removed)
 
 OPENING_BOOK_DB = os.path.join(os.path.dirname(__file__), 'openings.pgn')
+OPENING_BOOK_BIN = os.path.join(os.path.dirname(__file__), 'openings.bin')
+# Only the first BOOK_MAX_PLIES plies of each game are indexed
+BOOK_MAX_PLIES = 20
+# Parallel builds hand each worker at most this many bytes of PGN at a time
+BOOK_CHUNK_BYTES = 32 * 1024 * 1024
+# Sorted run record written by book workers: key, move, games, wins, draws, losses
+BOOK_RUN_RECORD = struct.Struct('>QHIIII')
 
-class OpeningBook:
-    def __init__(self, pgn_path=OPENING_BOOK_DB):
-        self.book = {}
-        if not os.path.exists(pgn_path):
-            print(f"[MoonBot] Opening book not found: {pgn_path}\nYou can download a Lichess PGN or use OpeningBook.download_lichess_book().")
+def open_pgn(pgn_path):
+    # .pgn.bz2 dumps are decompressed on the fly
+    if pgn_path.endswith('.bz2'):
+        import bz2
+        return bz2.open(pgn_path, 'rt', encoding='utf-8', errors='replace')
+    return open(pgn_path, 'r', encoding='utf-8', errors='replace')
+
+def book_move_key(board, move):
+    # Polyglot move encoding: to | from << 6 | promotion << 12, castling as king takes rook
+    to_square = move.to_square
+    if board.is_castling(move) and not board.chess960:
+        to_square = (to_square & 56) | (7 if chess.square_file(to_square) > chess.square_file(move.from_square) else 0)
+    return to_square | move.from_square << 6 | ((move.promotion - 1) << 12 if move.promotion else 0)
+
+@functools.lru_cache(maxsize=None)
+def book_visitor_class():
+    # chess.pgn is slow to import and only needed when a book is built
+    import chess.pgn
+
+    class BookVisitor(chess.pgn.BaseVisitor):
+        # Collects (zobrist key, side to move, polyglot move) for the first
+        # max_plies mainline moves; later moves are not even SAN-parsed
+        def __init__(self, max_plies=BOOK_MAX_PLIES):
+            self.max_plies = max_plies
+
+        def begin_game(self):
+            self.game_result = '*'
+            self.moves = []
+
+        def visit_header(self, tagname, tagvalue):
+            if tagname == 'Result':
+                self.game_result = tagvalue
+
+        def begin_variation(self):
+            return chess.pgn.SKIP
+
+        def begin_parse_san(self, board, san):
+            if len(self.moves) >= self.max_plies:
+                return chess.pgn.SKIP
+
+        def visit_move(self, board, move):
+            self.moves.append((chess.polyglot.zobrist_hash(board), board.turn, book_move_key(board, move)))
+
+        def handle_error(self, error):
+            # Broken games are cut at the first illegal or unreadable move
+            pass
+
+        def result(self):
+            return self.game_result, self.moves
+
+    return BookVisitor
+
+def iter_book_games(pgn_file, max_plies=BOOK_MAX_PLIES):
+    # Streams (result, moves) game by game from an open PGN file
+    import chess.pgn
+    visitor = book_visitor_class()
+    while True:
+        game = chess.pgn.read_game(pgn_file, Visitor=lambda: visitor(max_plies))
+        if game is None:
             return
-        with open(pgn_path, 'r', encoding='utf-8') as f:
-            self._parse_pgn(f.read())
-
-    def _parse_pgn(self, pgn_text):
-        pgn_io = io.StringIO(pgn_text)
-        while True:
-            game = chess.pgn.read_game(pgn_io)
-            if game is None:
-                break
-            board = game.board()
-            for move in game.mainline_moves():
-                fen = board.fen()
-                if fen not in self.book:
-                    self.book[fen] = move.uci()
-                board.push(move)
+        yield game
+
+def add_book_game(counts, result, moves):
+    # counts[key][move] = [games, wins, draws, losses] for the side to move
+    white_score = {'1-0': 1, '0-1': -1, '1/2-1/2': 0}.get(result)
+    for key, turn, move in moves:
+        stats = counts.setdefault(key, {}).setdefault(move, [0, 0, 0, 0])
+        stats[0] += 1
+        if white_score is not None:
+            score = white_score if turn == chess.WHITE else -white_score
+            stats[2 if score == 0 else (1 if score > 0 else 3)] += 1
+
+def write_book(positions, book_path, min_games=1):
+    # Polyglot book: 16-byte big-endian entries (key, move, weight, learn)
+    # sorted by key. positions yields (key, {move: stats}) in key order.
+    # weight = 2 * wins + draws, scaled to 16 bits per position;
+    # learn holds the number of games the move was played in.
+    entries = 0
+    with open(book_path, 'wb') as f:
+        for key, position in positions:
+            moves = [(move, stats) for move, stats in position.items() if stats[0] >= min_games]
+            if not moves:
+                continue
+            weights = [2 * stats[1] + stats[2] for _, stats in moves]
+            scale = max(1, -(-max(weights) // 0xFFFF))
+            for (move, stats), weight in sorted(zip(moves, weights), key=lambda item: (-item[1], item[0][0])):
+                f.write(struct.pack('>QHHI', key, move, weight // scale, min(stats[0], 0xFFFFFFFF)))
+                entries += 1
+    return entries
+
+def pgn_chunks(pgn_path, chunk_bytes=BOOK_CHUNK_BYTES):
+    # Splits a PGN file into (start, end) byte ranges that each begin on an [Event header
+    size = os.path.getsize(pgn_path)
+    bounds = [0]
+    with open(pgn_path, 'rb') as f:
+        for target in range(chunk_bytes, size, chunk_bytes):
+            if target <= bounds[-1]:
+                continue
+            f.seek(target)
+            f.readline()
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line or line.startswith(b'[Event '):
+                    break
+            if line and pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def _build_book_chunk(pgn_path, start, end, max_plies, run_path):
+    # Worker: parse one byte range and write its counts as a sorted run file
+    with open(pgn_path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8', errors='replace')
+    counts = {}
+    games = 0
+    for result, moves in iter_book_games(io.StringIO(text), max_plies):
+        add_book_game(counts, result, moves)
+        games += 1
+    with open(run_path, 'wb') as out:
+        for key in sorted(counts):
+            for move, stats in sorted(counts[key].items()):
+                out.write(BOOK_RUN_RECORD.pack(key, move, *stats))
+    return games
+
+def _read_run(run_path):
+    with open(run_path, 'rb') as f:
+        for block in iter(lambda: f.read(BOOK_RUN_RECORD.size * 4096), b''):
+            yield from BOOK_RUN_RECORD.iter_unpack(block)
+
+def merge_book_runs(run_paths):
+    # k-way merge of sorted run files, yielding (key, {move: stats}) one position at a time
+    key = None
+    position = {}
+    for record in heapq.merge(*(_read_run(path) for path in run_paths)):
+        if record[0] != key:
+            if position:
+                yield key, position
+            key = record[0]
+            position = {}
+        stats = position.setdefault(record[1], [0, 0, 0, 0])
+        for i in range(4):
+            stats[i] += record[2 + i]
+    if position:
+        yield key, position
+
+class OpeningBook:
+    def __init__(self, pgn_path=OPENING_BOOK_DB, book_path=OPENING_BOOK_BIN, max_plies=BOOK_MAX_PLIES):
+        # Uses the binary book, building it from the PGN (or PGN.bz2) first if needed
+        self.reader = None
+        if not os.path.exists(book_path):
+            if not os.path.exists(pgn_path) and os.path.exists(pgn_path + '.bz2'):
+                pgn_path += '.bz2'
+            if not os.path.exists(pgn_path):
+                print(f"[MoonBot] Opening book not found: {pgn_path}\nYou can download a Lichess PGN or use OpeningBook.download_lichess_book().")
+                return
+            OpeningBook.build(pgn_path, book_path, max_plies)
+        self.reader = chess.polyglot.open_reader(book_path)
+
+    @staticmethod
+    def build(pgn_path, book_path=OPENING_BOOK_BIN, max_plies=BOOK_MAX_PLIES, min_games=1, workers=None):
+        # Plain PGN files bigger than one chunk are parsed in parallel; .bz2 streams
+        # cannot be split by byte offset and are always read serially
+        if workers != 1 and not pgn_path.endswith('.bz2') and os.path.getsize(pgn_path) > BOOK_CHUNK_BYTES:
+            return OpeningBook.build_parallel(pgn_path, book_path, max_plies, min_games, workers)
+        start = time.perf_counter()
+        counts = {}
+        games = 0
+        with open_pgn(pgn_path) as f:
+            for result, moves in iter_book_games(f, max_plies):
+                add_book_game(counts, result, moves)
+                games += 1
+                if games % 10000 == 0:
+                    print(f"[MoonBot] Indexed {games} games, {len(counts)} positions...")
+        entries = write_book(((key, counts[key]) for key in sorted(counts)), book_path, min_games)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"[MoonBot] Opening book built from {games} games ({games / elapsed:.0f} games/s): {entries} moves in {len(counts)} positions.")
+        return games
+
+    @staticmethod
+    def build_parallel(pgn_path, book_path=OPENING_BOOK_BIN, max_plies=BOOK_MAX_PLIES, min_games=1, workers=None, chunk_bytes=BOOK_CHUNK_BYTES):
+        # Each chunk is parsed in a worker process into a sorted run file on disk,
+        # then the runs are merged so only one position is held in memory at a time
+        start = time.perf_counter()
+        chunks = pgn_chunks(pgn_path, chunk_bytes)
+        run_dir = tempfile.mkdtemp(prefix='moonbot_book_', dir=os.path.dirname(os.path.abspath(book_path)))
+        games = 0
+        try:
+            run_paths = [os.path.join(run_dir, f'run_{i:05d}.bin') for i in range(len(chunks))]
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_build_book_chunk, pgn_path, chunk_start, chunk_end, max_plies, run_path)
+                           for (chunk_start, chunk_end), run_path in zip(chunks, run_paths)]
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    games += future.result()
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    print(f"[MoonBot] Parsed {done}/{len(chunks)} chunks, {games} games ({games / elapsed:.0f} games/s)...")
+            entries = write_book(merge_book_runs(run_paths), book_path, min_games)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"[MoonBot] Opening book built from {games} games ({games / elapsed:.0f} games/s): {entries} moves.")
+        return games
 
     def get_move(self, fen):
-        return self.book.get(fen)
+        # Random book move, weighted by results; None when out of book
+        if self.reader is None:
+            return None
+        try:
+            return self.reader.weighted_choice(chess.Board(fen)).move.uci()
+        except IndexError:
+            return None
 
     @staticmethod
-    def download_lichess_book(pgn_path=OPENING_BOOK_DB):
+    def download_lichess_book(pgn_path=OPENING_BOOK_DB + '.bz2'):
+        # Saved compressed; the book builder reads .pgn.bz2 directly
         url = 'https://database.lichess.org/lichess_db_standard_rated_2023-12.pgn.bz2'  # Example, can be changed
         print('Downloading opening book (this may take a while)...')
-        import bz2
+        import urllib.request
         response = urllib.request.urlopen(url)
-        decompressor = bz2.BZ2Decompressor()
-        with open(pgn_path, 'w', encoding='utf-8') as out:
+        with open(pgn_path, 'wb') as out:
             for chunk in iter(lambda: response.read(1024*1024), b''):
-                data = decompressor.decompress(chunk)
-                out.write(data.decode('utf-8', errors='ignore'))
+                out.write(chunk)
         print('Opening book downloaded.')
 
-try:
-    import cython
-except ImportError:
-    cython = None
+def format_search_info(info):
+    depth, score, pv, nodes = info
+    if abs(score) >= MATE_BOUND:
+        score_text = f"mate {(MATE_SCORE - abs(score) + 1) // 2 * (1 if score > 0 else -1)}"
+    else:
+        score_text = f"{score / 100:+.2f}"
+    return f"MoonBot thinking: depth {depth}  {score_text}  {nodes} nodes  {' '.join(pv[:5])}"
+
+BOARD_BACKGROUNDS = {}
+
+def board_background(color_choice=0):
+    # The 64 squares pre-rendered once per orientation
+    if color_choice not in BOARD_BACKGROUNDS:
+        surf = pygame.Surface((WIDTH, HEIGHT))
+        for row in range(8):
+            for col in range(8):
+                display_row, display_col = (row, col) if color_choice == 0 else (7-row, 7-col)
+                color = WHITE if (display_row + display_col) % 2 == 0 else BROWN
+                pygame.draw.rect(surf, color, (display_col * SQUARE_SIZE, display_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+        BOARD_BACKGROUNDS[color_choice] = surf.convert()
+    return BOARD_BACKGROUNDS[color_choice]
+
+@functools.lru_cache(maxsize=None)
+def get_font(name, size):
+    return pygame.font.SysFont(name, size)
+
+@functools.lru_cache(maxsize=256)
+def render_text(text, name, size, color):
+    return get_font(name, size).render(text, True, color)
+
+def screen_pieces(board, color_choice=0):
+    # {(row, col) on screen: piece symbol}
+    pieces = {}
+    for square, piece in board.piece_map().items():
+        row, col = 7 - chess.square_rank(square), chess.square_file(square)
+        pieces[(row, col) if color_choice == 0 else (7-row, 7-col)] = piece.symbol()
+    return pieces
+
+def draw_square(win, pos, piece=None, selected=False, color_choice=0):
+    rect = pygame.Rect(pos[1] * SQUARE_SIZE, pos[0] * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+    win.blit(board_background(color_choice), rect, rect)
+    if selected:
+        pygame.draw.rect(win, HIGHLIGHT, rect, 5)
+    if piece:
+        win.blit(PIECE_IMAGES[piece], rect)
+    return rect
 
 def draw_board(win, board, selected_square=None, color_choice=0):
-    for row in range(8):
-        for col in range(8):
-            # Flip board for black
-            display_row, display_col = (row, col) if color_choice == 0 else (7-row, 7-col)
-            color = WHITE if (display_row + display_col) % 2 == 0 else BROWN
-            rect = pygame.Rect(display_col * SQUARE_SIZE, display_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-            pygame.draw.rect(win, color, rect)
-            if selected_square == (row, col):
-                pygame.draw.rect(win, HIGHLIGHT, rect, 5)
-            # Get the correct square for the board
-            board_row, board_col = (row, col) if color_choice == 0 else (7-row, 7-col)
-            piece = board.piece_at(chess.square(board_col, 7 - board_row))
-            if piece:
-                win.blit(PIECE_IMAGES[piece.symbol()], rect)
+    win.blit(board_background(color_choice), (0, 0))
+    pieces = screen_pieces(board, color_choice)
+    for pos, piece in pieces.items():
+        win.blit(PIECE_IMAGES[piece], (pos[1] * SQUARE_SIZE, pos[0] * SQUARE_SIZE))
+    if selected_square is not None:
+        draw_square(win, selected_square, pieces.get(selected_square), True, color_choice)
+
+class BoardRenderer:
+    # Redraws only the squares whose piece or highlight changed since the
+    # last frame and pushes just those rects to the display
+    def __init__(self, win, color_choice=0):
+        self.win = win
+        self.color_choice = color_choice
+        self.pieces = None
+        self.selected = None
+        self.overlay = None
+
+    def draw(self, board, selected=None, overlay=None):
+        pieces = screen_pieces(board, self.color_choice)
+        if self.pieces is None or overlay != self.overlay:
+            draw_board(self.win, board, selected, self.color_choice)
+            if overlay:
+                self.draw_overlay(overlay)
+            pygame.display.flip()
+        else:
+            dirty = {pos for pos in pieces.keys() | self.pieces.keys() if pieces.get(pos) != self.pieces.get(pos)}
+            if selected != self.selected:
+                dirty.update(pos for pos in (selected, self.selected) if pos is not None)
+            if dirty:
+                pygame.display.update([draw_square(self.win, pos, pieces.get(pos), pos == selected, self.color_choice)
+                                       for pos in dirty])
+        self.pieces = pieces
+        self.selected = selected
+        self.overlay = overlay
+
+    def draw_overlay(self, message):
+        self.win.blit(render_text(message, "arialblack", 32, (255,80,80)), (40, HEIGHT//2-20))
+        self.win.blit(render_text("Press any key or close window to exit", "arial", 20, (200,200,200)), (40, HEIGHT//2+30))
 
 def get_square_under_mouse(pos):
     x, y = pos
@@ -222,10 +534,12 @@ def menu():
     font = pygame.font.SysFont("arialblack", 40)
     small_font = pygame.font.SysFont("arial", 28)
     tiny_font = pygame.font.SysFont("arial", 20)
+    clock = pygame.time.Clock()
     color_choice = 0  # 0=White, 1=Black
     depth = 3
     running = True
     while running:
+        clock.tick(FPS)
         win.fill((18, 22, 32))
         # Title
         pygame.draw.rect(win, (60, 120, 255), (0, 0, 420, 70), border_radius=18)
@@ -257,7 +571,7 @@ def menu():
         pygame.draw.rect(win, (100,200,100), start_btn, border_radius=12)
         win.blit(font.render("Start", True, (0,0,0)), (160, 295))
         # Footer
-        win.blit(tiny_font.render("MoonBot by snave | Cython support: {}".format('ON' if cython else 'OFF'), True, (120,120,160)), (10, 330))
+        win.blit(tiny_font.render("MoonBot by snave | Cython support: {}".format('OFF' if BitboardMoonBot is None else 'ON'), True, (120,120,160)), (10, 330))
         pygame.display.flip()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -288,6 +602,8 @@ def main():
     clock = pygame.time.Clock()
     load_images()
     bot = MoonBot()
+    renderer = BoardRenderer(win, color_choice)
+    searcher = SearchWorker()
     selected = None
     running = True
     user_turn = (color_choice == 0)
@@ -297,14 +613,7 @@ def main():
     game_over_message = None
     while running:
         clock.tick(FPS)
-        draw_board(win, bot.board, selected, color_choice)
-        if game_over_message:
-            font = pygame.font.SysFont("arialblack", 32)
-            msg = font.render(game_over_message, True, (255,80,80))
-            win.blit(msg, (40, HEIGHT//2-20))
-            small = pygame.font.SysFont("arial", 20)
-            win.blit(small.render("Press any key or close window to exit", True, (200,200,200)), (40, HEIGHT//2+30))
-        pygame.display.flip()
+        renderer.draw(bot.board, selected, game_over_message)
         if game_over:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
@@ -333,16 +642,27 @@ def main():
                     if move in bot.board.legal_moves:
                         bot.board.push(move)
                         user_turn = False
+                        # A ponder hit keeps the running search, a miss discards it
+                        searcher.ponder_hit(move.uci(), MOVETIME_MS)
                     selected = None
                     move_from = None
                     move_to = None
+        if not running:
+            break
         if not user_turn and not bot.board.is_game_over():
-            pygame.display.set_caption("MoonBot is thinking...")
-            draw_board(win, bot.board, None, color_choice)
-            pygame.display.flip()
-            bot_move = bot.get_best_move(depth)
+            if not searcher.busy():
+                pygame.display.set_caption("MoonBot is thinking...")
+                searcher.start(bot.board, MOVETIME_MS, depth)
+            bot_move = searcher.poll()
+            if searcher.busy():
+                caption = format_search_info(searcher.info) if searcher.info else "MoonBot is thinking..."
+                if caption != pygame.display.get_caption()[0]:
+                    pygame.display.set_caption(caption)
+                continue
             if bot_move:
-                bot.board.push(bot_move)
+                bot.make_move(bot_move)
+                if PONDER:
+                    searcher.ponder(bot.board, depth)
             user_turn = True
             pygame.display.set_caption("MoonBot Chess (Pygame)")
         # Check for game over
@@ -364,8 +684,15 @@ def main():
                 game_over_message = "Draw: Fivefold repetition!"
             else:
                 game_over_message = f"Game over: {result}"
+    searcher.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--build-book':
+        # python moonbot_pygame.py --build-book games.pgn[.bz2] [max_plies] [workers]
+        OpeningBook.build(sys.argv[2], OPENING_BOOK_BIN,
+                          int(sys.argv[3]) if len(sys.argv) > 3 else BOOK_MAX_PLIES,
+                          workers=int(sys.argv[4]) if len(sys.argv) > 4 else None)
+        sys.exit()
     main()